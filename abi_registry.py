@@ -0,0 +1,69 @@
+import json
+import marshal
+import os
+import sys
+import threading
+from typing import Dict, List
+
+from web3 import Web3
+
+from cache import cache_path, write_atomic
+
+ABI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "abi")
+
+_abis: Dict[str, List] = {}
+_abis_lock = threading.Lock()
+
+
+def _compiled_abi_path(name: str, stat: os.stat_result) -> str:
+    # marshal output is only stable for a given python version, and the source file's
+    # mtime/size act as the invalidation key
+    version = f"py{sys.version_info.major}{sys.version_info.minor}"
+    return cache_path(
+        "abi", f"{name}.{stat.st_mtime_ns}.{stat.st_size}.{version}.marshal"
+    )
+
+
+def _load_abi_file(name: str) -> List:
+    path = os.path.join(ABI_DIR, f"{name}.json")
+    stat = os.stat(path)
+    compiled_path = _compiled_abi_path(name, stat)
+
+    # marshal is used rather than pickle since it can only hold plain data
+    try:
+        with open(compiled_path, "rb") as f:
+            return marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    with open(path, "r") as f:
+        abi = json.load(f)
+
+    try:
+        write_atomic(compiled_path, marshal.dumps(abi))
+    except OSError:
+        pass  # the compiled copy is only an optimization
+
+    return abi
+
+
+def get_abi(name: str) -> List:
+    """
+    Return the parsed ABI from abi/<name>.json, loading it at most once per process.
+    """
+    abi = _abis.get(name)
+    if abi is None:
+        with _abis_lock:
+            abi = _abis.get(name)
+            if abi is None:
+                abi = _abis[name] = _load_abi_file(name)
+    return abi
+
+
+def get_contract(web3: Web3, abi_name: str, address: str):
+    """
+    Return the contract object for the ABI at the given address. The ABI is parsed once per
+    process; contracts hold their web3 instance, so they are built per call rather than
+    cached, which would keep every web3 instance alive.
+    """
+    return web3.eth.contract(address=address, abi=get_abi(abi_name))
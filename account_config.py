@@ -0,0 +1,87 @@
+import json
+from dataclasses import dataclass, fields
+from typing import List
+
+from credentials import *
+from private_request import ApiCredentials
+
+# every manifest entry must bring its own, mixing them with credentials.py's would pair one
+# account's API key with another's STARK key or wallet
+REQUIRED_MANIFEST_FIELDS = (
+    "api_key",
+    "api_secret",
+    "api_passphrase",
+    "stark_private_key",
+    "eth_signer_key_name",
+)
+
+
+@dataclass(frozen=True)
+class AccountConfig:
+    name: str
+    api_key: str
+    api_secret: str
+    api_passphrase: str
+    stark_private_key: str
+    eth_signer_key_name: str
+    aws_credentials_profile_name: str
+
+    @property
+    def api_credentials(self) -> ApiCredentials:
+        return ApiCredentials(self.api_key, self.api_secret, self.api_passphrase)
+
+
+def default_account_config() -> AccountConfig:
+    return AccountConfig(
+        name="default",
+        api_key=API_KEY,
+        api_secret=API_SECRET,
+        api_passphrase=API_PASSPHRASE,
+        stark_private_key=STARK_PRIVATE_KEY,
+        eth_signer_key_name=ETH_SIGNER_KEY_NAME,
+        aws_credentials_profile_name=AWS_CREDENTIALS_PROFILE_NAME,
+    )
+
+
+def load_accounts_manifest(path: str) -> List[AccountConfig]:
+    """
+    Load a list of accounts from a JSON or YAML manifest. The file holds either a list of
+    accounts or a mapping with an "accounts" list; each account uses the AccountConfig field
+    names. Only aws_credentials_profile_name may be left out, it then falls back to
+    credentials.py; the other credentials are required in every entry.
+    """
+    with open(path, "r") as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+
+            manifest = yaml.safe_load(f)
+        else:
+            manifest = json.load(f)
+
+    if isinstance(manifest, dict):
+        manifest = manifest.get("accounts", [])
+    if not isinstance(manifest, list) or not manifest:
+        raise ValueError(f"no accounts found in manifest {path}")
+
+    defaults = default_account_config()
+    known_fields = {f.name for f in fields(AccountConfig)}
+
+    accounts = []
+    for i, entry in enumerate(manifest):
+        unknown = set(entry) - known_fields
+        if unknown:
+            raise ValueError(
+                f"unknown fields in manifest entry {i}: {', '.join(sorted(unknown))}"
+            )
+        missing = [f for f in REQUIRED_MANIFEST_FIELDS if not entry.get(f)]
+        if missing:
+            raise ValueError(f"manifest entry {i} is missing {', '.join(missing)}")
+        values = {f: entry.get(f, getattr(defaults, f)) for f in known_fields}
+        values["name"] = entry.get("name", f"account-{i}")
+        accounts.append(AccountConfig(**values))
+
+    names = [a.name for a in accounts]
+    if len(set(names)) != len(names):
+        raise ValueError(f"duplicate account names in manifest {path}")
+
+    return accounts
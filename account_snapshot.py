@@ -0,0 +1,337 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from account_config import AccountConfig, default_account_config
+from private_request import private_request
+from utils import get_dydx_host
+
+ACCOUNT_SNAPSHOT_TTL_SECONDS = float(os.environ.get("DYDX_TOOLS_ACCOUNT_TTL", "5"))
+
+# called with (network_id, api_key, account id -> changed fields)
+ChangeListener = Callable[[int, str, Dict[str, FrozenSet[str]]], None]
+
+# position statuses after which a position is no longer open
+CLOSED_POSITION_STATUSES = ("CLOSED", "LIQUIDATED")
+
+
+class Position(NamedTuple):
+    market: str
+    side: str
+    size: str
+    entry_price: str
+    unrealized_pnl: str
+
+    @classmethod
+    def from_api(cls, position: dict) -> "Position":
+        return cls(
+            position["market"],
+            position.get("side"),
+            position.get("size"),
+            position.get("entryPrice"),
+            position.get("unrealizedPnl"),
+        )
+
+
+class AccountSnapshot(NamedTuple):
+    """
+    The parts of a dydx account this tool uses. Amounts are kept as the API's decimal strings.
+    """
+
+    id: str
+    position_id: str
+    stark_key: str
+    equity: str
+    free_collateral: str
+    quote_balance: str
+    pending_deposits: str
+    pending_withdrawals: str
+    # sorted by market
+    open_positions: Tuple[Position, ...]
+
+    @classmethod
+    def from_api(cls, account: dict) -> "AccountSnapshot":
+        return cls(
+            account.get("id"),
+            account.get("positionId"),
+            account.get("starkKey"),
+            account.get("equity"),
+            account.get("freeCollateral"),
+            account.get("quoteBalance"),
+            account.get("pendingDeposits"),
+            account.get("pendingWithdrawals"),
+            _sorted_positions(
+                Position.from_api(p)
+                for p in (account.get("openPositions") or {}).values()
+            ),
+        )
+
+
+# fields of a partial account update (websocket "accounts" entries) -> snapshot fields
+_ACCOUNT_UPDATE_FIELDS = {
+    "positionId": "position_id",
+    "starkKey": "stark_key",
+    "equity": "equity",
+    "freeCollateral": "free_collateral",
+    "quoteBalance": "quote_balance",
+    "pendingDeposits": "pending_deposits",
+    "pendingWithdrawals": "pending_withdrawals",
+}
+
+
+def _sorted_positions(positions) -> Tuple[Position, ...]:
+    return tuple(sorted(positions, key=lambda p: p.market))
+
+
+def _changed_fields(
+    old: Optional[AccountSnapshot], new: AccountSnapshot
+) -> FrozenSet[str]:
+    if old is None:
+        return frozenset(AccountSnapshot._fields)
+    return frozenset(f for f, a, b in zip(new._fields, old, new) if a != b)
+
+
+def _merge_changes(
+    entry: "_Entry",
+    old: Dict[str, AccountSnapshot],
+    new: Dict[str, AccountSnapshot],
+) -> Dict[str, FrozenSet[str]]:
+    """
+    Diff two sets of snapshots, adding the changes to the entry's pending ones.
+    """
+    changes = {}
+    for account_id, snapshot in new.items():
+        changed = _changed_fields(old.get(account_id), snapshot)
+        if changed:
+            changes[account_id] = changed
+            entry.changes[account_id] = (
+                entry.changes.get(account_id, frozenset()) | changed
+            )
+    return changes
+
+
+class _Entry:
+    def __init__(
+        self,
+        snapshots: Dict[str, AccountSnapshot],
+        accounts: Dict[str, dict],
+        updated_at: float,
+    ):
+        # account id -> snapshot, in the order the API returned them
+        self.snapshots = snapshots
+        # account id -> the account as the API last returned it in full, deltas aside
+        self.accounts = accounts
+        # when full accounts last arrived
+        self.updated_at = updated_at
+        # account id -> fields changed by deltas since the last refresh()
+        self.changes: Dict[str, FrozenSet[str]] = {}
+        self.live = False
+
+
+class AccountSnapshotCache:
+    """
+    Snapshots of every account returned by /v3/accounts, per (network, API key), next to
+    the accounts as returned.
+
+    Reads are served from the cache for `max_age` seconds. A delta feed (the websocket
+    accounts channel) can keep balances and positions current through apply_update(); while
+    it is live refresh() reports the accumulated changes without a request, otherwise it
+    re-fetches and reports what differs from the previous snapshots.
+    """
+
+    def __init__(self, ttl: float = ACCOUNT_SNAPSHOT_TTL_SECONDS):
+        self.ttl = ttl
+        self._entries: Dict[Tuple[int, str], _Entry] = {}
+        self._listeners: List[ChangeListener] = []
+        self._lock = threading.Lock()
+
+    def _fetch(self, network_id: int, account: AccountConfig) -> Dict[str, dict]:
+        response = private_request(
+            get_dydx_host(network_id),
+            "get",
+            "accounts",
+            {},
+            credentials=account.api_credentials,
+        )
+        accounts = response.get("accounts") or []
+        if not accounts:
+            raise Exception("dydx returned no accounts for this API key")
+        return {a.get("id"): a for a in accounts}
+
+    def _store(
+        self, key: Tuple[int, str], accounts: Dict[str, dict]
+    ) -> Dict[str, FrozenSet[str]]:
+        snapshots = {
+            account_id: AccountSnapshot.from_api(a)
+            for account_id, a in accounts.items()
+        }
+        with self._lock:
+            previous = self._entries.get(key)
+            entry = self._entries[key] = _Entry(snapshots, accounts, time.monotonic())
+            if previous is not None:
+                entry.live = previous.live
+                entry.changes = previous.changes
+            changes = _merge_changes(
+                entry, previous.snapshots if previous is not None else {}, snapshots
+            )
+        return changes
+
+    def _current(
+        self,
+        network_id: int,
+        account: Optional[AccountConfig],
+        max_age: Optional[float],
+    ) -> _Entry:
+        account = account or default_account_config()
+        key = (network_id, account.api_key)
+        max_age = self.ttl if max_age is None else max_age
+
+        entry = self._entries.get(key)
+        # deltas don't carry equity or free collateral (they move with oracle prices), so
+        # even a live entry expires. An entry deltas created before any full account
+        # arrived has nothing to serve, however old it may be.
+        if (
+            entry is None
+            or not entry.accounts
+            or time.monotonic() - entry.updated_at > max_age
+        ):
+            self._notify(key, self._store(key, self._fetch(network_id, account)))
+            entry = self._entries[key]
+        return entry
+
+    def get(
+        self,
+        network_id: int,
+        account: AccountConfig = None,
+        max_age: Optional[float] = None,
+    ) -> List[AccountSnapshot]:
+        return list(self._current(network_id, account, max_age).snapshots.values())
+
+    def primary_account(
+        self,
+        network_id: int,
+        account: AccountConfig = None,
+        max_age: Optional[float] = None,
+    ) -> dict:
+        """
+        The first account as the API returned it, every field included.
+        """
+        accounts = self._current(network_id, account, max_age).accounts
+        # dydx appears to only support 1 account per eth key
+        return next(iter(accounts.values()))
+
+    def primary(
+        self,
+        network_id: int,
+        account: AccountConfig = None,
+        max_age: Optional[float] = None,
+    ) -> AccountSnapshot:
+        # dydx appears to only support 1 account per eth key
+        return self.get(network_id, account, max_age)[0]
+
+    def position_id(self, network_id: int, account: AccountConfig = None) -> str:
+        """
+        positionIds never change, so any snapshot will do, however old.
+        """
+        return self.primary(network_id, account, max_age=float("inf")).position_id
+
+    def refresh(
+        self, network_id: int, account: AccountConfig = None
+    ) -> Dict[str, FrozenSet[str]]:
+        """
+        Bring the snapshots up to date and return account id -> changed fields since the
+        previous refresh.
+        """
+        account = account or default_account_config()
+        key = (network_id, account.api_key)
+
+        entry = self._entries.get(key)
+        if entry is None or not entry.live:
+            self._notify(key, self._store(key, self._fetch(network_id, account)))
+
+        with self._lock:
+            entry = self._entries[key]
+            changes, entry.changes = entry.changes, {}
+        return changes
+
+    def set_live(self, network_id: int, api_key: str, live: bool):
+        """
+        Called by a delta feed when it (dis)connects. Once the feed drops, refresh() goes
+        back to re-fetching.
+        """
+        with self._lock:
+            entry = self._entries.get((network_id, api_key))
+            if entry is not None:
+                entry.live = live
+
+    def apply_update(self, network_id: int, api_key: str, contents: dict):
+        """
+        Apply a v3_accounts channel message: a full "account" (on subscribe) and/or partial
+        "accounts" and "positions" updates.
+        """
+        key = (network_id, api_key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                # a miss until a full account arrives, either here or from a fetch
+                entry = self._entries[key] = _Entry({}, {}, float("-inf"))
+
+            updated = dict(entry.snapshots)
+            if contents.get("account"):
+                snapshot = AccountSnapshot.from_api(contents["account"])
+                updated[snapshot.id] = snapshot
+                entry.accounts = {**entry.accounts, snapshot.id: contents["account"]}
+
+            for partial in contents.get("accounts") or []:
+                old = updated.get(partial.get("id"))
+                if old is not None:
+                    updated[old.id] = old._replace(
+                        **{
+                            field: partial[name]
+                            for name, field in _ACCOUNT_UPDATE_FIELDS.items()
+                            if name in partial
+                        }
+                    )
+
+            for position in contents.get("positions") or []:
+                account_id = position.get("accountId") or next(iter(updated), None)
+                old = updated.get(account_id)
+                if old is None:
+                    continue
+                others = [
+                    p for p in old.open_positions if p.market != position["market"]
+                ]
+                if position.get("status") not in CLOSED_POSITION_STATUSES:
+                    others.append(Position.from_api(position))
+                updated[account_id] = old._replace(
+                    open_positions=_sorted_positions(others)
+                )
+
+            changes = _merge_changes(entry, entry.snapshots, updated)
+            entry.snapshots = updated
+            if contents.get("account"):
+                entry.updated_at = time.monotonic()
+
+        self._notify(key, changes)
+
+    def on_change(self, listener: ChangeListener):
+        """
+        Call `listener(network_id, api_key, changes)` whenever snapshots change, from a fetch
+        or a delta.
+        """
+        with self._lock:
+            self._listeners.append(listener)
+
+    def _notify(self, key: Tuple[int, str], changes: Dict[str, FrozenSet[str]]):
+        if not changes:
+            return
+        for listener in list(self._listeners):
+            listener(key[0], key[1], changes)
+
+
+_account_snapshots = AccountSnapshotCache()
+
+
+def get_account_snapshots() -> AccountSnapshotCache:
+    return _account_snapshots
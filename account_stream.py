@@ -0,0 +1,213 @@
+import asyncio
+import json
+import sys
+from typing import AsyncIterator, NamedTuple, Optional
+
+import aiohttp
+
+from account_config import AccountConfig, default_account_config
+from account_snapshot import AccountSnapshotCache, get_account_snapshots
+from private_request import EMPTY_BODY, get_request_signer, now_iso
+from rate_limit import retry_delay
+from utils import get_dydx_host
+
+ACCOUNTS_CHANNEL = "v3_accounts"
+# the private channel is authenticated like a GET of this path
+WS_AUTH_PATH = "/ws/accounts"
+
+# keys of the channel contents -> update kind, lists of updates
+_UPDATE_KINDS = {
+    "accounts": "account",
+    "positions": "position",
+    "transfers": "transfer",
+    "orders": "order",
+    "fills": "fill",
+    "fundingPayments": "funding",
+}
+
+
+class AccountUpdate(NamedTuple):
+    # account, position, transfer, order, fill or funding
+    kind: str
+    data: dict
+
+
+def ws_url(network_id: int) -> str:
+    host = get_dydx_host(network_id)
+    if host.startswith("https://"):
+        host = "wss://" + host[len("https://") :]
+    elif host.startswith("http://"):
+        host = "ws://" + host[len("http://") :]
+    return host + "/v3/ws"
+
+
+def subscribe_message(account: AccountConfig) -> dict:
+    credentials = account.api_credentials
+    timestamp = now_iso()
+    return {
+        "type": "subscribe",
+        "channel": ACCOUNTS_CHANNEL,
+        "accountNumber": "0",
+        "apiKey": credentials.api_key,
+        "passphrase": credentials.api_passphrase,
+        "timestamp": timestamp,
+        "signature": get_request_signer(credentials).sign(
+            WS_AUTH_PATH, "GET", timestamp, EMPTY_BODY
+        ),
+    }
+
+
+def updates_from_contents(contents: dict) -> list:
+    """
+    Split a subscribed or channel_data payload into AccountUpdates.
+    """
+    updates = []
+    if contents.get("account"):
+        updates.append(AccountUpdate("account", contents["account"]))
+    for key, kind in _UPDATE_KINDS.items():
+        for data in contents.get(key) or []:
+            updates.append(AccountUpdate(kind, data))
+    return updates
+
+
+class AccountStream:
+    """
+    Streams updates from the private v3_accounts websocket channel:
+
+        async with AccountStream(network_id) as stream:
+            async for update in stream:
+                ...
+
+    The first updates are the full account and recent transfers sent on subscribe, then every
+    change as it happens. Dropped connections are re-established (and re-authenticated) with
+    backoff. Updates are also applied to the account snapshot cache, which is marked live
+    while the stream is connected.
+    """
+
+    def __init__(
+        self,
+        network_id: int,
+        account: AccountConfig = None,
+        session: Optional[aiohttp.ClientSession] = None,
+        snapshots: Optional[AccountSnapshotCache] = None,
+        heartbeat: float = 30,
+    ):
+        self.network_id = network_id
+        self.account = account or default_account_config()
+        self.snapshots = snapshots or get_account_snapshots()
+        self.heartbeat = heartbeat
+        self._session = session
+        self._owns_session = session is None
+
+    async def __aenter__(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _apply(self, contents: dict):
+        self.snapshots.apply_update(self.network_id, self.account.api_key, contents)
+
+    def _set_live(self, live: bool):
+        self.snapshots.set_live(self.network_id, self.account.api_key, live)
+
+    async def _connection(self) -> AsyncIterator[AccountUpdate]:
+        async with self._session.ws_connect(
+            ws_url(self.network_id), heartbeat=self.heartbeat
+        ) as ws:
+            await ws.send_str(json.dumps(subscribe_message(self.account)))
+            try:
+                async for msg in ws:
+                    if msg.type != aiohttp.WSMsgType.TEXT:
+                        if msg.type == aiohttp.WSMsgType.ERROR:
+                            raise ws.exception()
+                        continue
+
+                    message = json.loads(msg.data)
+                    if message.get("type") == "error":
+                        raise Exception(
+                            f"dydx websocket error: {message.get('message')}"
+                        )
+                    if message.get("type") not in ("subscribed", "channel_data"):
+                        continue
+
+                    contents = message.get("contents") or {}
+                    self._apply(contents)
+                    if message["type"] == "subscribed":
+                        self._set_live(True)
+                    for update in updates_from_contents(contents):
+                        yield update
+            finally:
+                self._set_live(False)
+
+    async def __aiter__(self) -> AsyncIterator[AccountUpdate]:
+        if self._session is None:
+            raise Exception("stream is not open, use `async with` or pass a session")
+
+        attempt = 0
+        while True:
+            reason = "closed by dydx"
+            try:
+                async for update in self._connection():
+                    attempt = 0
+                    yield update
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                reason = repr(e)
+
+            # back off unless the connection got as far as delivering updates
+            delay = retry_delay(attempt)
+            # stderr, so `watch --json` output stays parseable
+            print(
+                f"dydx websocket disconnected ({reason}), reconnecting in {delay:.1f}s",
+                file=sys.stderr,
+            )
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+def _format_update(update: AccountUpdate, as_json: bool) -> str:
+    if as_json:
+        return json.dumps({"kind": update.kind, "data": update.data})
+
+    data = update.data
+    if update.kind == "transfer":
+        return (
+            f"transfer {data.get('type')} {data.get('status')}: "
+            f"{data.get('creditAmount') or data.get('debitAmount')} "
+            f"{data.get('creditAsset') or data.get('debitAsset')} "
+            f"tx={data.get('transactionHash')}"
+        )
+    if update.kind == "position":
+        return (
+            f"position {data.get('market')} {data.get('status')}: "
+            f"{data.get('side')} {data.get('size')} @ {data.get('entryPrice')}"
+        )
+    if update.kind == "fill":
+        return (
+            f"fill {data.get('market')} {data.get('side')} "
+            f"{data.get('size')} @ {data.get('price')}"
+        )
+    return f"{update.kind}: {data}"
+
+
+async def _watch(network_id: int, kinds, as_json: bool):
+    async with AccountStream(network_id) as stream:
+        async for update in stream:
+            if kinds and update.kind not in kinds:
+                continue
+            print(_format_update(update, as_json), flush=True)
+
+
+def watch(args):
+    network_id = int(args.network_id)
+    try:
+        asyncio.run(_watch(network_id, args.kind, args.json))
+    except KeyboardInterrupt:
+        pass
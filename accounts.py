@@ -1,25 +1,37 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Tuple
+
 from dydx3 import private_key_to_public_key_pair_hex
 from dydx3.constants import *
 from dydx3.eth_signing.eth_prive_action import SignEthPrivateAction
 from dydx3.eth_signing.onboarding_action import SignOnboardingAction
 from dydx3.helpers.request_helpers import generate_now_iso
-from dydx3.helpers.requests import request
 from eulith_web3.signer import Signer, Signature
-from eulith_web3.signing import construct_signing_middleware
-from eulith_web3.eulith_web3 import EulithWeb3
 
+from account_config import AccountConfig, default_account_config
+from account_snapshot import get_account_snapshots
 from credentials import *
+from fees import contract_transaction
+from http_session import request
 from private_request import private_request
+from signing_pool import SigningPool, get_signing_pool
+from tx_pipeline import TxPipeline
 from utils import get_dydx_host, get_exchange_contract, get_kms_signer
+from web3_provider import open_web3
 
 
 def normalize_signature(signature: Signature) -> str:
     """
     Normalize the signature to a string, for instance for serialization for an RPC method.
     """
-    compatible_v = signature.v + 27
-    last_two_chars = hex(compatible_v)[-2:]
-    return str(signature)[:-2] + last_two_chars
+    return _normalize_vrs(signature.v, signature.r, signature.s)
+
+
+@lru_cache(maxsize=1024)
+def _normalize_vrs(v: int, r: int, s: int) -> str:
+    # same as str(signature) (r || s || v as hex) with v shifted to the 27/28 convention
+    return "0x%064x%064x%02x" % (r, s, v + 27)
 
 
 def create_user(parser_args):
@@ -27,7 +39,7 @@ def create_user(parser_args):
     signer = get_kms_signer()
     host = get_dydx_host(network_id)
 
-    public_x, public_y = private_key_to_public_key_pair_hex(STARK_PRIVATE_KEY)
+    public_x, public_y = stark_public_key_pair(STARK_PRIVATE_KEY)
 
     sign_offchain_action = SignOnboardingAction(signer, NETWORK_ID_MAINNET)
     message = {
@@ -65,41 +77,53 @@ def get_account(parser_args):
     print(_get_account_internal(network_id))
 
 
-def _get_account_internal(network_id: int) -> dict:
-    host = get_dydx_host(network_id)
-    response = private_request(host, "get", "accounts", {})
-    return response.get("accounts", {})[
-        0
-    ]  # dydx appears to only supports 1 account per eth key
+def _get_account_internal(
+    network_id: int, account: AccountConfig = None, max_age: float = None
+) -> dict:
+    return get_account_snapshots().primary_account(network_id, account, max_age)
 
 
-def get_registration_signature(network_id: int) -> dict:
-    host = get_dydx_host(network_id)
-    response = private_request(host, "get", "registration", {})
-    return response.get("signature")
+def get_position_id(network_id: int, account: AccountConfig = None) -> str:
+    """
+    An account's positionId never changes, so it's only fetched once per process.
+    """
+    return get_account_snapshots().position_id(network_id, account)
 
 
-def create_new_api_key_with_signer(signer: Signer, network_id: int):
+@lru_cache(maxsize=None)
+def stark_public_key_pair(stark_private_key: str) -> Tuple[str, str]:
+    return private_key_to_public_key_pair_hex(stark_private_key)
+
+
+def get_registration_signature(network_id: int, account: AccountConfig = None) -> dict:
+    account = account or default_account_config()
     host = get_dydx_host(network_id)
+    response = private_request(
+        host, "get", "registration", {}, credentials=account.api_credentials
+    )
+    return response.get("signature")
+
 
+def _api_key_message_hash(signer: Signer, timestamp: str) -> bytes:
     sign_offchain_action = SignEthPrivateAction(signer, NETWORK_ID_MAINNET)
-    request_path = "/".join(["/v3", "api-keys"])
-    timestamp = generate_now_iso()
+    return sign_offchain_action.get_hash(
+        method="POST",
+        request_path="/v3/api-keys",
+        body="{}",
+        timestamp=timestamp,
+    )
 
-    message = {
-        "method": "POST",
-        "request_path": request_path,
-        "body": "{}",
-        "timestamp": timestamp,
-    }
-    message_hash = sign_offchain_action.get_hash(**message)
-    signature = signer.sign_msg_hash(message_hash)
+
+def _post_api_key(
+    signer: Signer, network_id: int, signature: Signature, timestamp: str
+) -> dict:
+    host = get_dydx_host(network_id)
     ns = (
         normalize_signature(signature) + "00"
     )  # // 00 comes from SIGNATURE_TYPE_NO_PREPEND in constants
 
     return request(
-        host + request_path,
+        host + "/v3/api-keys",
         "post",
         {
             "DYDX-SIGNATURE": ns,
@@ -111,31 +135,86 @@ def create_new_api_key_with_signer(signer: Signer, network_id: int):
     ).data
 
 
+def create_new_api_key_with_signer(signer: Signer, network_id: int):
+    timestamp = generate_now_iso()
+    signature = signer.sign_msg_hash(_api_key_message_hash(signer, timestamp))
+    return _post_api_key(signer, network_id, signature, timestamp)
+
+
+def create_new_api_keys_with_signer(
+    signer: Signer, network_id: int, count: int
+) -> List[dict]:
+    """
+    Create `count` API keys concurrently. Each one is timestamped, signed on the signer's
+    shared pool and posted on its own, so a key's timestamp is never older than its own KMS
+    round trip and KMS traffic stays bounded per key however many accounts share it.
+    """
+    pool = get_signing_pool(signer)
+    # at most one key per pool worker waits for its signature, so none sits in the queue
+    workers = max(1, min(count, pool.workers))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_create_api_key_on_pool, pool, network_id)
+            for _ in range(count)
+        ]
+        return [f.result() for f in futures]
+
+
+def _create_api_key_on_pool(pool: SigningPool, network_id: int) -> dict:
+    timestamp = generate_now_iso()
+    message_hash = _api_key_message_hash(pool.signer, timestamp)
+    signature = pool.submit(message_hash).result().signature
+    return _post_api_key(pool.signer, network_id, signature, timestamp)
+
+
+def create_api_key(parser_args):
+    network_id = int(parser_args.network_id)
+    account = default_account_config()
+    signer = get_kms_signer(
+        account.eth_signer_key_name, account.aws_credentials_profile_name
+    )
+    keys = create_new_api_keys_with_signer(signer, network_id, int(parser_args.count))
+    for key in keys:
+        print(key)
+    print()
+    get_signing_pool(signer).print_stats()
+    print("YOU SHOULD WRITE DOWN THESE API CREDENTIALS")
+
+
+def _create_api_keys_internal(
+    network_id: int, count: int = 1, account: AccountConfig = None
+) -> List[dict]:
+    account = account or default_account_config()
+    signer = get_kms_signer(
+        account.eth_signer_key_name, account.aws_credentials_profile_name
+    )
+    return create_new_api_keys_with_signer(signer, network_id, count)
+
+
 def register_user(parser_args):
     network_id = int(parser_args.network_id)
     if network_id != 1:
         raise ValueError("only mainnet is supported for now")
 
-    public_x, public_y = private_key_to_public_key_pair_hex(STARK_PRIVATE_KEY)
+    public_x, public_y = stark_public_key_pair(STARK_PRIVATE_KEY)
 
     reg_signature = get_registration_signature(network_id)
     kms_signer = get_kms_signer()
 
-    with EulithWeb3(
-        "https://eth-main.eulithrpc.com/v0",
-        eulith_token=EULITH_TOKEN,
-        signing_middle_ware=construct_signing_middleware(kms_signer),
-    ) as ew3:
+    with open_web3(kms_signer) as ew3:
         contract = get_exchange_contract(network_id, ew3)
 
-        tx_params = contract.functions.registerUser(
-            kms_signer.address, int(public_x, 16), reg_signature
-        ).buildTransaction({"from": kms_signer.address, "gas": 100000})
+        tx_params = contract_transaction(
+            ew3,
+            contract.functions.registerUser(
+                kms_signer.address, int(public_x, 16), reg_signature
+            ),
+            kms_signer.address,
+        )
 
-        tx_hash = ew3.eth.send_transaction(tx_params)
-        print(f"Registration tx hash: {tx_hash.hex()}")
+        with TxPipeline(ew3, kms_signer.address) as pipeline:
+            pending = pipeline.submit(tx_params, "register")
+            print(f"Registration tx hash: {pending.tx_hash}")
 
-
-def show_wallet(_args):
-    signer = get_kms_signer()
-    print(f"wallet address: {signer.address}")
+            receipt = pipeline.wait(pending)
+            print(f"Registration mined in block {receipt['blockNumber']}")
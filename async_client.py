@@ -0,0 +1,218 @@
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Iterable, List, Optional
+from urllib.parse import urlparse
+
+import aiohttp
+from dydx3.errors import DydxApiError
+from dydx3.helpers.request_helpers import generate_query_path
+
+from instrumentation import span
+from private_request import (
+    ApiCredentials,
+    default_api_credentials,
+    encode_body,
+    get_request_signer,
+)
+from rate_limit import (
+    MAX_RETRIES,
+    RETRYABLE_STATUS_CODES,
+    get_bucket,
+    is_idempotent,
+    parse_retry_after,
+    retry_delay,
+)
+from utils import get_dydx_host
+
+DEFAULT_CONCURRENCY = 8
+
+
+class _AsyncErrorResponse:
+    """
+    Adapts an aiohttp error response to the shape DydxApiError expects from requests.
+    """
+
+    def __init__(self, status: int, text: str):
+        self.status_code = status
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class AsyncDydxPrivateClient:
+    """
+    asyncio counterpart of private_request for a single set of API credentials.
+
+    Pass a shared aiohttp.ClientSession to pool connections across many clients, otherwise the
+    client opens (and closes) its own session when used as an async context manager.
+    """
+
+    def __init__(
+        self,
+        network_id: int,
+        credentials: Optional[ApiCredentials] = None,
+        stark_private_key: Optional[str] = None,
+        session: Optional[aiohttp.ClientSession] = None,
+        timeout: float = 30,
+    ):
+        self.network_id = network_id
+        self.host = get_dydx_host(network_id)
+        self.credentials = credentials or default_api_credentials()
+        # never defaulted, a withdrawal must be signed with this account's own key
+        self.stark_private_key = stark_private_key
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session = session
+        self._owns_session = session is None
+
+    async def __aenter__(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(headers={"Accept": "application/json"})
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def private_request(self, method: str, endpoint: str, data: dict = {}):
+        if self._session is None:
+            raise Exception("client session is not open, use `async with` or pass a session")
+
+        request_path = "/".join(["/v3", endpoint])
+        path = urlparse(request_path).path
+        bucket = get_bucket(method, path)
+        idempotent = is_idempotent(method)
+        signer = get_request_signer(self.credentials)
+        body = encode_body(data)
+
+        attempt = 0
+        while True:
+            await bucket.acquire_async()
+            # re-signed on every attempt, so retries don't send a stale timestamp
+            headers = signer.headers(request_path, method, body)
+            headers["Content-Type"] = "application/json"
+
+            try:
+                with span("dydx.request", f"{method.upper()} {path}") as s:
+                    async with self._session.request(
+                        method.upper(),
+                        self.host + request_path,
+                        headers=headers,
+                        data=body,
+                        timeout=self.timeout,
+                    ) as response:
+                        status = response.status
+                        retry_after = response.headers.get("Retry-After")
+                        text = await response.text()
+                    if not str(status).startswith("2"):
+                        s.set_error()
+            except aiohttp.ClientConnectionError:
+                if not idempotent or attempt >= MAX_RETRIES:
+                    raise
+                await asyncio.sleep(retry_delay(attempt))
+                attempt += 1
+                continue
+
+            if (
+                idempotent
+                and status in RETRYABLE_STATUS_CODES
+                and attempt < MAX_RETRIES
+            ):
+                await asyncio.sleep(retry_delay(attempt, parse_retry_after(retry_after)))
+                attempt += 1
+                continue
+
+            if not str(status).startswith("2"):
+                raise DydxApiError(_AsyncErrorResponse(status, text))
+            return json.loads(text) if text else {}
+
+    async def get_account(self) -> dict:
+        response = await self.private_request("get", "accounts")
+        return response.get("accounts", {})[
+            0
+        ]  # dydx appears to only supports 1 account per eth key
+
+    async def get_transfers(
+        self, transfer_type=None, limit=None, created_before_or_at=None
+    ) -> List:
+        endpoint = generate_query_path(
+            "transfers",
+            {
+                "type": transfer_type,
+                "limit": limit,
+                "createdBeforeOrAt": created_before_or_at,
+            },
+        )
+        response = await self.private_request("get", endpoint)
+        return response.get("transfers")
+
+    async def get_registration_signature(self) -> str:
+        response = await self.private_request("get", "registration")
+        return response.get("signature")
+
+    async def post_withdrawal(self, amount: int, position_id=None) -> dict:
+        if not self.stark_private_key:
+            raise Exception("no stark private key given, can't sign the withdrawal")
+
+        # imported here since funding pulls in the whole web3 stack
+        from funding import build_withdrawal_params
+
+        if position_id is None:
+            position_id = (await self.get_account()).get("positionId")
+
+        # STARK signing is CPU-bound, keep it off the event loop
+        params = await asyncio.get_running_loop().run_in_executor(
+            None,
+            build_withdrawal_params,
+            self.network_id,
+            position_id,
+            amount,
+            self.stark_private_key,
+        )
+        return await self.private_request("post", "withdrawals", params)
+
+
+async def gather_bounded(
+    awaitables: Iterable[Awaitable], concurrency: int = DEFAULT_CONCURRENCY
+) -> List[Any]:
+    """
+    Await everything with at most `concurrency` in flight. Results are returned in input
+    order; a failure is returned in place of its result rather than cancelling the rest.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(aw):
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(*(run(aw) for aw in awaitables), return_exceptions=True)
+
+
+async def fan_out(
+    network_id: int,
+    accounts: Iterable[tuple],
+    fn: Callable[[AsyncDydxPrivateClient], Awaitable],
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> List[Any]:
+    """
+    Run `fn` against a client for each (ApiCredentials, stark_private_key) tuple, sharing one
+    connection pool. The stark key may be None when `fn` does not sign withdrawals.
+    """
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(
+        connector=connector, headers={"Accept": "application/json"}
+    ) as session:
+        clients = [
+            AsyncDydxPrivateClient(
+                network_id,
+                credentials=credentials,
+                stark_private_key=stark_private_key,
+                session=session,
+            )
+            for credentials, stark_private_key in accounts
+        ]
+        return await gather_bounded((fn(c) for c in clients), concurrency)
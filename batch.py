@@ -0,0 +1,112 @@
+import io
+import json
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import redirect_stdout
+from typing import Callable, Dict, List
+
+from account_config import AccountConfig
+from accounts import _create_api_keys_internal, _get_account_internal
+from funding import _deposit_internal, _get_transfers_internal, _start_withdraw_internal
+from status import _get_status_internal
+
+
+def _batch_get_account(args, account: AccountConfig):
+    return _get_account_internal(int(args["network_id"]), account)
+
+
+def _batch_get_transfers(args, account: AccountConfig):
+    return _get_transfers_internal(int(args["network_id"]), account)
+
+
+def _batch_status(args, account: AccountConfig):
+    return _get_status_internal(int(args["network_id"]), account)
+
+
+def _batch_create_api_key(args, account: AccountConfig):
+    return _create_api_keys_internal(
+        int(args["network_id"]), int(args["count"]), account
+    )
+
+
+def _batch_start_withdraw(args, account: AccountConfig):
+    return _start_withdraw_internal(
+        int(args["network_id"]), int(args["amount"]), account
+    )
+
+
+def _batch_deposit(args, account: AccountConfig):
+    return _deposit_internal(int(args["network_id"]), float(args["amount"]), account)
+
+
+BATCH_COMMANDS: Dict[str, Callable] = {
+    "get-account": _batch_get_account,
+    "get-transfers": _batch_get_transfers,
+    "create-api-key": _batch_create_api_key,
+    "status": _batch_status,
+    "start-withdraw-dydx": _batch_start_withdraw,
+    "deposit-dydx": _batch_deposit,
+}
+
+
+def _run_one(
+    command: str, args: dict, account: AccountConfig, quiet: bool = False
+) -> dict:
+    try:
+        if quiet:
+            # progress prints from worker processes would interleave with the results
+            with redirect_stdout(io.StringIO()):
+                result = BATCH_COMMANDS[command](args, account)
+        else:
+            result = BATCH_COMMANDS[command](args, account)
+        return {"account": account.name, "ok": True, "result": result}
+    except Exception as e:
+        return {"account": account.name, "ok": False, "error": repr(e)}
+
+
+def run_batch(
+    command: str,
+    args: dict,
+    accounts: List[AccountConfig],
+    workers: int = 8,
+    use_processes: bool = False,
+) -> List[dict]:
+    """
+    Run a subcommand for every account on a thread (default) or process pool. `args` must be
+    a plain dict of the parsed arguments so it can be shipped to worker processes. Results
+    come back in manifest order.
+    """
+    if command not in BATCH_COMMANDS:
+        raise ValueError(
+            f"{command} does not support --accounts, "
+            f"supported commands: {', '.join(BATCH_COMMANDS)}"
+        )
+
+    executor_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    # worker threads print through this process' stdout, which is captured as a whole;
+    # worker processes capture their own
+    with redirect_stdout(io.StringIO()), executor_cls(
+        max_workers=max(1, min(workers, len(accounts)))
+    ) as executor:
+        futures = [
+            executor.submit(_run_one, command, args, account, use_processes)
+            for account in accounts
+        ]
+        return [f.result() for f in futures]
+
+
+def print_batch_results(results: List[dict], output: str = "table"):
+    if output == "jsonl":
+        for r in results:
+            print(json.dumps(r, default=str))
+        return
+
+    name_width = max([len("ACCOUNT")] + [len(r["account"]) for r in results])
+    print(f"{'ACCOUNT'.ljust(name_width)}  STATUS  RESULT")
+    for r in results:
+        status = "ok" if r["ok"] else "error"
+        detail = json.dumps(r["result"], default=str) if r["ok"] else r["error"]
+        print(f"{r['account'].ljust(name_width)}  {status.ljust(6)}  {detail}")
+
+    failed = sum(1 for r in results if not r["ok"])
+    print()
+    print(f"{len(results) - failed} succeeded, {failed} failed")
@@ -0,0 +1,130 @@
+import json
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Tuple
+
+from account_config import (
+    AccountConfig,
+    default_account_config,
+    load_accounts_manifest,
+)
+from accounts import get_position_id
+from batch import print_batch_results
+from funding import build_withdrawal_params
+from private_request import private_request
+from utils import get_dydx_host
+
+
+def batch_withdraw(
+    network_id: int,
+    withdrawals: List[Tuple[AccountConfig, int]],
+    workers: int = 8,
+) -> List[dict]:
+    """
+    Start a fast withdrawal for every (account, amount) pair. Each account's positionId is
+    looked up once, the STARK signatures are computed on a process pool (signing is CPU-bound
+    pure Python), and the signed withdrawals are posted concurrently over the shared session.
+    A withdrawal that fails any of these steps is reported with its error, the others go on.
+    """
+    if not withdrawals:
+        return []
+
+    accounts = {a.name: a for a, _ in withdrawals}
+    with ThreadPoolExecutor(max_workers=min(workers, len(accounts))) as executor:
+        futures = {
+            name: executor.submit(get_position_id, network_id, a)
+            for name, a in accounts.items()
+        }
+        # an account that fails a phase is reported with that error and skips the rest
+        position_ids, errors = {}, {}
+        for name, future in futures.items():
+            try:
+                position_ids[name] = future.result()
+            except Exception as e:
+                errors[name] = e
+
+    signing = [i for i, (a, _) in enumerate(withdrawals) if a.name in position_ids]
+    # withdrawal index -> params, or the exception signing them raised
+    signed = {}
+    if signing:
+        with ProcessPoolExecutor(max_workers=min(workers, len(signing))) as executor:
+            futures = {
+                i: executor.submit(
+                    build_withdrawal_params,
+                    network_id,
+                    position_ids[withdrawals[i][0].name],
+                    withdrawals[i][1],
+                    withdrawals[i][0].stark_private_key,
+                )
+                for i in signing
+            }
+            for i, future in futures.items():
+                try:
+                    signed[i] = future.result()
+                except Exception as e:
+                    signed[i] = e
+
+    host = get_dydx_host(network_id)
+
+    def submit(i):
+        account, amount = withdrawals[i]
+        result = {"account": account.name, "amount": amount}
+        error = errors.get(account.name)
+        if error is None and isinstance(signed[i], Exception):
+            error = signed[i]
+        if error is not None:
+            result["error"] = repr(error)
+            result["ok"] = False
+            return result
+        try:
+            result["result"] = private_request(
+                host,
+                "post",
+                "withdrawals",
+                signed[i],
+                credentials=account.api_credentials,
+            )
+            result["ok"] = True
+        except Exception as e:
+            result["error"] = repr(e)
+            result["ok"] = False
+        return result
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(withdrawals))) as executor:
+        return list(executor.map(submit, range(len(withdrawals))))
+
+
+def _parse_withdrawals(args) -> List[Tuple[AccountConfig, int]]:
+    accounts = (
+        load_accounts_manifest(args.accounts)
+        if args.accounts
+        else [default_account_config()]
+    )
+    accounts_by_name = {a.name: a for a in accounts}
+
+    if args.file:
+        with open(args.file, "r") as f:
+            entries = json.load(f)
+
+        withdrawals = []
+        for entry in entries:
+            name = entry.get("account", "default")
+            if name not in accounts_by_name:
+                raise ValueError(f"unknown account {name} in {args.file}")
+            withdrawals.append((accounts_by_name[name], int(entry["amount"])))
+        return withdrawals
+
+    # without a file every --amount is withdrawn from every account
+    return [(a, int(amount)) for a in accounts for amount in args.amount or []]
+
+
+def start_batch_withdraw(args):
+    network_id = int(args.network_id)
+    withdrawals = _parse_withdrawals(args)
+    if not withdrawals:
+        raise ValueError("nothing to withdraw, pass --amount or --file")
+
+    total = sum(amount for _, amount in withdrawals)
+    print(f"Withdrawing {total} USDC across {len(withdrawals)} withdrawals")
+
+    results = batch_withdraw(network_id, withdrawals, workers=args.workers)
+    print_batch_results(results, args.output)
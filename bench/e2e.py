@@ -0,0 +1,301 @@
+"""
+End-to-end benchmark for the manage.py subcommands and the signing paths.
+
+Starts the stand-in dydx API and Ethereum node from bench/stand_in.py, points the tool at it
+(DYDX_TOOLS_DYDX_HOST, DYDX_TOOLS_ETH_RPC_URL, a throwaway DYDX_TOOLS_CACHE_DIR), swaps the
+KMS signer for a local key, and then runs every subcommand in-process --runs times, reporting
+latency percentiles and throughput. The signing paths (normalize_signature,
+generate_request_signature and SignableWithdrawal.sign) are timed on their own.
+
+Results are printed as a table, or as JSON with --json / --output for regression tracking.
+The script exits non-zero if any command failed.
+
+Usage: python bench/e2e.py [--runs 20] [--concurrency 1] [--latency-ms 0] [--warm]
+                           [--command get-account ...] [--json] [--output results.json]
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from stand_in import StandIn
+
+NETWORK = ["--network-id", "1"]
+
+# subcommand -> argv
+SCENARIOS = {
+    "show-wallet": ["show-wallet"],
+    "create-user": ["create-user", *NETWORK],
+    "create-api-key": ["create-api-key", *NETWORK, "--count", "5"],
+    "get-account": ["get-account", *NETWORK],
+    "status": ["status", *NETWORK],
+    "get-transfers": ["get-transfers", *NETWORK],
+    "register-user": ["register-user", *NETWORK],
+    "approve-dydx-exchange": ["approve-dydx-exchange", *NETWORK, "--amount", "25"],
+    "deposit-dydx": ["deposit-dydx", *NETWORK, "--amount", "25"],
+    "fund": ["fund", *NETWORK, "--amount", "25"],
+    "start-withdraw-dydx": ["start-withdraw-dydx", *NETWORK, "--amount", "10"],
+    "batch-withdraw": ["batch-withdraw", *NETWORK, "--amount", "10", "--amount", "20"],
+    "execute-withdraws": ["execute-withdraws", *NETWORK],
+    "sweep-withdraws": ["sweep-withdraws", *NETWORK, "--once"],
+}
+
+# subcommand -> why it isn't benchmarked
+SKIPPED = {
+    "serve": "long-running daemon",
+    "clear-signer-cache": "would drop the local bench signer",
+    "eth-to-usdc": "needs the Eulith swap API",
+}
+
+BENCH_ETH_PRIVATE_KEY = "0x" + "01" * 32
+BENCH_STARK_PRIVATE_KEY = (
+    "0x58c7d5a90b1776bde86ebac077e053ed85b0f7164f53b080304a531947f46e3"
+)
+
+
+def configure(stand_in: StandIn, cache_dir: str, respect_rate_limits: bool):
+    """
+    Point the tool at the stand-in. Has to run before any of the repo's modules are
+    imported, since they read the environment and credentials at import time.
+    """
+    os.environ["DYDX_TOOLS_DYDX_HOST"] = stand_in.url
+    # the scenarios run on mainnet's network id
+    os.environ["DYDX_TOOLS_ALLOW_MAINNET_DYDX_HOST"] = "1"
+    os.environ["DYDX_TOOLS_ETH_RPC_URL"] = stand_in.rpc_url
+    os.environ["DYDX_TOOLS_CACHE_DIR"] = cache_dir
+
+    import credentials
+
+    credentials.API_KEY = "00000000-0000-0000-0000-000000000000"
+    credentials.API_SECRET = base64.urlsafe_b64encode(b"bench-secret" * 3).decode()
+    credentials.API_PASSPHRASE = "bench"
+    credentials.STARK_PRIVATE_KEY = BENCH_STARK_PRIVATE_KEY
+    credentials.EULITH_TOKEN = "bench"
+    credentials.ETH_SIGNER_KEY_NAME = "bench"
+    credentials.AWS_CREDENTIALS_PROFILE_NAME = "bench"
+
+    from eulith_web3.signing import LocalSigner
+
+    import signer_cache
+
+    signer = LocalSigner(BENCH_ETH_PRIVATE_KEY)
+    signer_cache._memory_cache[("bench", "alias/bench")] = signer
+
+    if not respect_rate_limits:
+        import rate_limit
+
+        rate_limit.ENDPOINT_RATE_LIMITS.clear()
+        rate_limit.ENDPOINT_RATE_LIMITS[(None, None)] = (10**9, 1)
+
+    return signer
+
+
+def summarize(latencies: list, wall_seconds: float) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "runs": len(latencies),
+        "mean_ms": 1000 * statistics.mean(latencies),
+        "p50_ms": 1000 * latencies[len(latencies) // 2],
+        "p95_ms": 1000 * latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "min_ms": 1000 * latencies[0],
+        "max_ms": 1000 * latencies[-1],
+        "throughput_per_s": len(latencies) / wall_seconds,
+    }
+
+
+def bench_command(parser, run_command, argv, runs, warmup, concurrency) -> dict:
+    args = parser.parse_args(argv)
+
+    def run_once(_):
+        start = time.perf_counter()
+        run_command(args)
+        return time.perf_counter() - start
+
+    # output from every run (and thread) is discarded
+    with redirect_stdout(io.StringIO()):
+        for i in range(warmup):
+            run_once(i)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = list(executor.map(run_once, range(runs)))
+        wall_seconds = time.perf_counter() - start
+
+    return summarize(latencies, wall_seconds)
+
+
+def bench_callable(fn, min_seconds: float = 1.0, max_runs: int = 100000) -> dict:
+    fn()  # warm up
+    latencies = []
+    start = time.perf_counter()
+    while len(latencies) < max_runs and time.perf_counter() - start < min_seconds:
+        t = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def bench_signing(signer, min_seconds: float) -> dict:
+    from dydx3.constants import NETWORK_ID_MAINNET
+    from dydx3.starkex.withdrawal import SignableWithdrawal
+
+    from accounts import normalize_signature
+    from private_request import generate_request_signature
+
+    signature = signer.sign_msg_hash(b"\x01" * 32)
+    data = {"amount": "10", "asset": "USDC", "clientId": "1", "signature": "0" * 128}
+    withdrawal = SignableWithdrawal(
+        network_id=NETWORK_ID_MAINNET,
+        position_id=12345,
+        client_id="1",
+        human_amount="10",
+        expiration_epoch_seconds=int(time.time()) + 3600,
+    )
+
+    paths = {
+        "normalize_signature": lambda: normalize_signature(signature),
+        "generate_request_signature": lambda: generate_request_signature(
+            "/v3/withdrawals", "POST", "2026-01-01T00:00:00.000Z", data
+        ),
+        "SignableWithdrawal.sign": lambda: withdrawal.sign(BENCH_STARK_PRIVATE_KEY),
+    }
+    return {name: bench_callable(fn, min_seconds) for name, fn in paths.items()}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def print_table(results: dict):
+    print(f"{'command':<24} {'p50':>10} {'p95':>10} {'mean':>10} {'ops/s':>9}")
+    for name, r in results["commands"].items():
+        if "error" in r:
+            print(f"{name:<24} ERROR {r['error']}")
+        elif "skipped" in r:
+            print(f"{name:<24} skipped ({r['skipped']})")
+        else:
+            print(
+                f"{name:<24} {r['p50_ms']:>8.1f}ms {r['p95_ms']:>8.1f}ms "
+                f"{r['mean_ms']:>8.1f}ms {r['throughput_per_s']:>9.1f}"
+            )
+    print()
+    print(f"{'signing path':<28} {'p50':>10} {'mean':>10} {'ops/s':>11}")
+    for name, r in results["signing"].items():
+        print(
+            f"{name:<28} {1000 * r['p50_ms']:>8.1f}us {1000 * r['mean_ms']:>8.1f}us "
+            f"{r['throughput_per_s']:>11.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="end-to-end benchmark")
+    parser.add_argument("--runs", type=int, default=20, help="measured runs per command")
+    parser.add_argument("--warmup", type=int, default=1, help="unmeasured runs first")
+    parser.add_argument(
+        "--concurrency", type=int, default=1, help="threads running each command"
+    )
+    parser.add_argument(
+        "--latency-ms", type=float, default=0, help="delay the stand-in adds per response"
+    )
+    parser.add_argument(
+        "--warm",
+        action="store_true",
+        help="keep web3 connections open across runs, like the serve daemon",
+    )
+    parser.add_argument(
+        "--respect-rate-limits",
+        action="store_true",
+        help="keep the client-side dydx rate limits (off by default)",
+    )
+    parser.add_argument(
+        "--signing-seconds", type=float, default=1.0, help="time spent per signing path"
+    )
+    parser.add_argument(
+        "--command", action="append", help="only benchmark these subcommands"
+    )
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    with StandIn(latency_ms=args.latency_ms) as stand_in, tempfile.TemporaryDirectory(
+        prefix="dydx-tools-bench-"
+    ) as cache_dir:
+        signer = configure(stand_in, cache_dir, args.respect_rate_limits)
+
+        import manage
+        import web3_provider
+
+        if args.warm:
+            web3_provider.keep_web3_warm()
+
+        cli = manage.build_parser()
+        commands = {}
+        for name in args.command or list(SCENARIOS) + list(SKIPPED):
+            if name in SKIPPED:
+                commands[name] = {"skipped": SKIPPED[name]}
+                continue
+            try:
+                commands[name] = bench_command(
+                    cli,
+                    manage.run_command,
+                    SCENARIOS[name],
+                    args.runs,
+                    args.warmup,
+                    args.concurrency,
+                )
+            except Exception as e:
+                commands[name] = {"error": repr(e)}
+
+        signing = bench_signing(signer, args.signing_seconds)
+        web3_provider.close_warm_web3()
+
+    results = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "runs": args.runs,
+            "concurrency": args.concurrency,
+            "latency_ms": args.latency_ms,
+            "warm": args.warm,
+        },
+        "commands": commands,
+        "signing": signing,
+        "requests": dict(stand_in.requests),
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+    sys.exit(1 if any("error" in r for r in commands.values()) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Micro-benchmark for private request signing.
+
+Compares the per-call cost of the original path (decode the secret, key a new HMAC and
+serialize the payload for every request, then serialize it again for the body) with
+RequestSigner, which keys the HMAC once and signs the same body bytes it sends.
+
+Usage: python bench/signing.py [--number 20000] [--repeat 5] [--json]
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from dydx3.helpers.request_helpers import generate_now_iso, json_stringify, remove_nones
+
+from private_request import ApiCredentials, RequestSigner, encode_body
+
+CREDENTIALS = ApiCredentials(
+    "00000000-0000-0000-0000-000000000000",
+    base64.urlsafe_b64encode(os.urandom(30)).decode(),
+    "passphrase",
+)
+REQUEST_PATH = "/v3/withdrawals"
+PAYLOAD = {
+    "amount": "125.5",
+    "asset": "USDC",
+    "expiration": "2026-10-25T00:00:00.000Z",
+    "clientId": "1234567890123456",
+    "signature": "0" * 128,
+}
+
+
+def baseline(data: dict) -> tuple:
+    now = generate_now_iso()
+    data = remove_nones(data)
+    message = now + "POST" + REQUEST_PATH + (json_stringify(data) if data else "")
+    hashed = hmac.new(
+        base64.urlsafe_b64decode(CREDENTIALS.api_secret.encode("utf-8")),
+        msg=message.encode("utf-8"),
+        digestmod=hashlib.sha256,
+    )
+    signature = base64.urlsafe_b64encode(hashed.digest()).decode()
+    return json.dumps(remove_nones(data)), signature
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    signer = RequestSigner(CREDENTIALS)
+
+    def cached():
+        body = encode_body(PAYLOAD)
+        return body, signer.headers(REQUEST_PATH, "POST", body)
+
+    results = {}
+    for name, fn in (("baseline", lambda: baseline(PAYLOAD)), ("signer", cached)):
+        best = min(timeit.repeat(fn, number=args.number, repeat=args.repeat))
+        results[name] = 1e6 * best / args.number
+
+    if args.json:
+        print(json.dumps({"us_per_request": results}))
+        return
+    for name, us in results.items():
+        print(f"{name:>10}: {us:.2f} us/request")
+    print(f"   speedup: {results['baseline'] / results['signer']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+"""
+A local stand-in for the dydx v3 REST API and an Ethereum node, for benchmarks.
+
+One aiohttp app serves both:
+
+- /v3/accounts, /v3/transfers, /v3/withdrawals, /v3/markets, /v3/registration,
+  /v3/onboarding and /v3/api-keys with canned responses (signatures are not checked);
+- /rpc, a stub JSON-RPC node over websocket (what EulithWeb3 speaks) and plain HTTP POST. It
+  answers just enough for the commands in manage.py: fee history, gas estimates, nonces,
+  eth_call (every call returns `call_result` as a uint256, multicall aggregate3 included) and
+  raw transactions, which are mined instantly. Every mined transaction also shows up as a
+  confirmed DEPOSIT transfer, so deposit confirmation finds it on the first poll.
+
+Usage: python bench/stand_in.py [--port 8545] [--latency-ms 0]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from aiohttp import WSMsgType, web
+
+GWEI = 10**9
+POSITION_ID = "12345"
+CHAIN_ID = 1
+
+
+def _iso(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.") + "%03dZ" % (dt.microsecond // 1000)
+
+
+def _abi_codec():
+    import eth_abi
+
+    # eth_abi renamed decode_abi/encode_abi to decode/encode in v4
+    decode = getattr(eth_abi, "decode", None) or eth_abi.decode_abi
+    encode = getattr(eth_abi, "encode", None) or eth_abi.encode_abi
+    return decode, encode
+
+
+class StandIn:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_ms: float = 0,
+        seed_transfers: int = 50,
+        call_result: int = 10**30,
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency_ms / 1000
+        self.call_result = call_result
+        self.requests = Counter()
+
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._block_number = 1
+        self._nonce = 0
+        self._receipts = {}
+        self._transfers = []
+        start = datetime.utcnow() - timedelta(days=seed_transfers)
+        for i in range(seed_transfers):
+            self._add_transfer(
+                "DEPOSIT" if i % 2 else "WITHDRAWAL", None, start + timedelta(days=i)
+            )
+
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def rpc_url(self) -> str:
+        return f"{self.url}/rpc"
+
+    def _add_transfer(self, transfer_type: str, tx_hash, created_at: datetime) -> dict:
+        transfer = {
+            "id": f"transfer-{next(self._ids)}",
+            "type": transfer_type,
+            "debitAsset": "USDC",
+            "creditAsset": "USDC",
+            "debitAmount": "25",
+            "creditAmount": "25",
+            "transactionHash": tx_hash,
+            "status": "CONFIRMED",
+            "createdAt": _iso(created_at),
+            "confirmedAt": _iso(created_at),
+            "clientId": None,
+            "fromAddress": None,
+            "toAddress": None,
+        }
+        self._transfers.append(transfer)
+        return transfer
+
+    # dydx
+
+    async def accounts(self, request):
+        return web.json_response(
+            {
+                "accounts": [
+                    {
+                        "id": "00000000-0000-0000-0000-000000000000",
+                        "positionId": POSITION_ID,
+                        "starkKey": "0x" + "11" * 32,
+                        "equity": "1000.000000",
+                        "freeCollateral": "1000.000000",
+                        "quoteBalance": "1000.000000",
+                        "pendingDeposits": "0.000000",
+                        "pendingWithdrawals": "0.000000",
+                        "openPositions": {},
+                    }
+                ]
+            }
+        )
+
+    async def transfers(self, request):
+        transfer_type = request.query.get("type")
+        limit = int(request.query.get("limit", 100))
+        before = request.query.get("createdBeforeOrAt")
+        with self._lock:
+            matching = [
+                t
+                for t in reversed(self._transfers)
+                if (transfer_type is None or t["type"] == transfer_type)
+                and (before is None or t["createdAt"] <= before)
+            ]
+        return web.json_response({"transfers": matching[:limit]})
+
+    async def withdrawals(self, request):
+        body = await request.json()
+        return web.json_response(
+            {
+                "withdrawal": {
+                    "id": f"withdrawal-{next(self._ids)}",
+                    "type": "FAST_WITHDRAWAL",
+                    "status": "PENDING",
+                    "debitAsset": body.get("asset"),
+                    "debitAmount": body.get("amount"),
+                    "clientId": body.get("clientId"),
+                    "createdAt": _iso(datetime.utcnow()),
+                }
+            }
+        )
+
+    async def markets(self, request):
+        return web.json_response(
+            {"markets": {"ETH-USD": {"market": "ETH-USD", "oraclePrice": "2000.00"}}}
+        )
+
+    async def registration(self, request):
+        return web.json_response({"signature": "0x" + "00" * 65})
+
+    async def onboarding(self, request):
+        return web.json_response(
+            {
+                "apiKey": {
+                    "key": "00000000-0000-0000-0000-000000000000",
+                    "secret": "c2VjcmV0",
+                    "passphrase": "passphrase",
+                },
+                "user": {"ethereumAddress": request.headers.get("DYDX-ETHEREUM-ADDRESS")},
+                "account": {"positionId": POSITION_ID},
+            }
+        )
+
+    async def api_keys(self, request):
+        return web.json_response(
+            {
+                "apiKey": {
+                    "key": "00000000-0000-0000-0000-000000000000",
+                    "secret": "c2VjcmV0",
+                    "passphrase": "passphrase",
+                }
+            }
+        )
+
+    # ethereum
+
+    def _block(self, number: int) -> dict:
+        return {
+            "number": hex(number),
+            "hash": "0x" + number.to_bytes(32, "big").hex(),
+            "parentHash": "0x" + max(number - 1, 0).to_bytes(32, "big").hex(),
+            "timestamp": hex(int(time.time())),
+            "baseFeePerGas": hex(20 * GWEI),
+            "gasLimit": hex(30_000_000),
+            "gasUsed": hex(15_000_000),
+            "miner": "0x" + "00" * 20,
+            "transactions": [],
+        }
+
+    def _eth_call(self, data: str) -> str:
+        from eth_utils import function_signature_to_4byte_selector
+
+        decode, encode = _abi_codec()
+        payload = bytes.fromhex(data[2:])
+        result = encode(["uint256"], [self.call_result])
+        if payload[:4] == function_signature_to_4byte_selector(
+            "aggregate3((address,bool,bytes)[])"
+        ):
+            (calls,) = decode(["(address,bool,bytes)[]"], payload[4:])
+            return "0x" + encode(["(bool,bytes)[]"], [[(True, result)] * len(calls)]).hex()
+        return "0x" + result.hex()
+
+    def _send_raw_transaction(self, raw: str) -> str:
+        from eth_utils import keccak
+
+        tx_hash = "0x" + keccak(bytes.fromhex(raw[2:])).hex()
+        with self._lock:
+            self._nonce += 1
+            self._block_number += 1
+            self._receipts[tx_hash] = {
+                "transactionHash": tx_hash,
+                "transactionIndex": "0x0",
+                "blockHash": self._block(self._block_number)["hash"],
+                "blockNumber": hex(self._block_number),
+                "from": "0x" + "00" * 20,
+                "to": "0x" + "00" * 20,
+                "cumulativeGasUsed": hex(100_000),
+                "gasUsed": hex(100_000),
+                "effectiveGasPrice": hex(21 * GWEI),
+                "contractAddress": None,
+                "logs": [],
+                "logsBloom": "0x" + "00" * 256,
+                "status": "0x1",
+                "type": "0x2",
+            }
+            self._add_transfer("DEPOSIT", tx_hash, datetime.utcnow())
+        return tx_hash
+
+    def rpc(self, method: str, params: list):
+        if method == "eth_chainId":
+            return hex(CHAIN_ID)
+        if method == "net_version":
+            return str(CHAIN_ID)
+        if method == "eth_blockNumber":
+            return hex(self._block_number)
+        if method == "eth_getBlockByNumber":
+            return self._block(self._block_number)
+        if method == "eth_getBalance":
+            return hex(10**20)
+        if method == "eth_getTransactionCount":
+            return hex(self._nonce)
+        if method == "eth_gasPrice":
+            return hex(21 * GWEI)
+        if method == "eth_maxPriorityFeePerGas":
+            return hex(GWEI)
+        if method == "eth_feeHistory":
+            blocks = int(params[0], 16) if isinstance(params[0], str) else params[0]
+            return {
+                "oldestBlock": hex(max(self._block_number - blocks + 1, 0)),
+                "baseFeePerGas": [hex(20 * GWEI)] * (blocks + 1),
+                "gasUsedRatio": [0.5] * blocks,
+                "reward": [[hex(GWEI)]] * blocks,
+            }
+        if method == "eth_estimateGas":
+            return hex(100_000)
+        if method == "eth_call":
+            return self._eth_call(params[0].get("data") or params[0].get("input"))
+        if method == "eth_sendRawTransaction":
+            return self._send_raw_transaction(params[0])
+        if method == "eth_getTransactionReceipt":
+            with self._lock:
+                return self._receipts.get(params[0].lower())
+        raise NotImplementedError(method)
+
+    def _rpc_response(self, message: dict) -> dict:
+        method = message.get("method")
+        self.requests[f"RPC {method}"] += 1
+        response = {"jsonrpc": "2.0", "id": message.get("id")}
+        try:
+            response["result"] = self.rpc(method, message.get("params") or [])
+        except NotImplementedError:
+            response["error"] = {"code": -32601, "message": f"{method} not supported"}
+        except Exception as e:
+            response["error"] = {"code": -32000, "message": str(e)}
+        return response
+
+    async def rpc_http(self, request):
+        return web.json_response(self._rpc_response(await request.json()))
+
+    async def rpc_websocket(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            await ws.send_str(json.dumps(self._rpc_response(json.loads(msg.data))))
+        return ws
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        if request.path != "/rpc":
+            self.requests[f"{request.method} {request.path}"] += 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+        return await handler(request)
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self._middleware])
+        app.add_routes(
+            [
+                web.get("/v3/accounts", self.accounts),
+                web.get("/v3/transfers", self.transfers),
+                web.post("/v3/withdrawals", self.withdrawals),
+                web.get("/v3/markets", self.markets),
+                web.get("/v3/registration", self.registration),
+                web.post("/v3/onboarding", self.onboarding),
+                web.post("/v3/api-keys", self.api_keys),
+                web.get("/rpc", self.rpc_websocket),
+                web.post("/rpc", self.rpc_http),
+            ]
+        )
+        return app
+
+    def start(self) -> "StandIn":
+        """
+        Serve on a background thread; with port 0 a free port is picked.
+        """
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._runner = web.AppRunner(self.app())
+            self._loop.run_until_complete(self._runner.setup())
+            site = web.TCPSite(self._runner, self.host, self.port)
+            self._loop.run_until_complete(site.start())
+            self.port = self._runner.addresses[0][1]
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self._runner.cleanup())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="stand-in", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="dydx/ethereum stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8545)
+    parser.add_argument(
+        "--latency-ms", type=float, default=0, help="delay added to every response"
+    )
+    args = parser.parse_args()
+
+    with StandIn(args.host, args.port, args.latency_ms) as stand_in:
+        print(f"DYDX_TOOLS_DYDX_HOST={stand_in.url}")
+        print("DYDX_TOOLS_ALLOW_MAINNET_DYDX_HOST=1")
+        print(f"DYDX_TOOLS_ETH_RPC_URL={stand_in.rpc_url}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
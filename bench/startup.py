@@ -0,0 +1,111 @@
+"""
+Startup benchmark for the manage.py CLI.
+
+For every subcommand this runs a fresh interpreter under `python -X importtime`, imports
+manage.py plus the module the subcommand's handler lives in, and sums the cumulative import
+time of the top-level imports. The best of --runs is compared against the per-command budget
+(milliseconds) in bench/startup_budget.json; the script exits non-zero if any command is over.
+Commands without a measured budget are only reported.
+
+Usage: python bench/startup.py [--runs 5] [--json] [--command get-account ...]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_PATH = os.path.join(ROOT, "bench", "startup_budget.json")
+HELP = "help"
+
+sys.path.insert(0, ROOT)
+
+
+def command_modules() -> dict:
+    import manage
+
+    parser = manage.build_parser()
+    subparsers = next(
+        a for a in parser._actions if isinstance(a, argparse._SubParsersAction)
+    )
+    return {
+        name: subparser.get_default("func").module_name
+        for name, subparser in subparsers.choices.items()
+    }
+
+
+def parse_importtime(stderr: str) -> float:
+    """
+    Sum the cumulative time (us) of top-level imports in `-X importtime` output.
+    """
+    total_us = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        if not name[1:].startswith(" "):
+            total_us += int(cumulative)
+    return total_us / 1000
+
+
+def measure(module_name: str = None) -> float:
+    code = "import manage"
+    if module_name:
+        code += f"; import {module_name}"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise Exception(result.stderr.strip().splitlines()[-1])
+    return parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="startup benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="runs per command")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument(
+        "--command", action="append", help="only benchmark these subcommands"
+    )
+    args = parser.parse_args()
+
+    with open(BUDGET_PATH, "r") as f:
+        budgets = json.load(f)
+
+    targets = {HELP: None, **command_modules()}
+    if args.command:
+        targets = {k: v for k, v in targets.items() if k in args.command}
+
+    results = []
+    for command, module_name in targets.items():
+        result = {"command": command, "budget_ms": budgets.get(command)}
+        try:
+            result["import_ms"] = min(measure(module_name) for _ in range(args.runs))
+            result["ok"] = (
+                result["budget_ms"] is None or result["import_ms"] <= result["budget_ms"]
+            )
+        except Exception as e:
+            result["error"] = str(e)
+            result["ok"] = False
+        results.append(result)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for r in results:
+            status = "ok" if r["ok"] else "OVER BUDGET" if "error" not in r else "ERROR"
+            timing = f"{r['import_ms']:.1f}ms" if "import_ms" in r else r["error"]
+            budget = "-" if r["budget_ms"] is None else f"{r['budget_ms']}ms"
+            print(f"{r['command']:<24} {timing:>12}  budget={budget}  {status}")
+
+    sys.exit(0 if all(r["ok"] for r in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
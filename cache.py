@@ -0,0 +1,33 @@
+import json
+import os
+
+CACHE_DIR = os.path.expanduser(
+    os.environ.get("DYDX_TOOLS_CACHE_DIR", "~/.cache/dydx-tools")
+)
+
+
+def cache_path(*parts: str) -> str:
+    return os.path.join(CACHE_DIR, *parts)
+
+
+def read_json(path: str, default=None):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def write_atomic(path: str, data: bytes):
+    """
+    Write via a temp file and rename so concurrent readers never see a partial file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def write_json(path: str, value):
+    write_atomic(path, json.dumps(value, indent=2).encode("utf-8"))
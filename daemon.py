@@ -0,0 +1,121 @@
+import io
+import json
+import os
+import socket
+import socketserver
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+from typing import List, Optional, Tuple
+
+from cache import cache_path
+from exceptions import BadJurisdictionException
+from jurisdiction import check_ip_location, start_background_reverification
+
+DEFAULT_SOCKET_PATH = cache_path("daemon.sock")
+# seconds a client gets to send its command line, so a stalled one can't block the daemon
+REQUEST_TIMEOUT_SECONDS = 10
+
+
+def execute(argv: List[str], cwd: Optional[str] = None) -> Tuple[int, str]:
+    """
+    Run a manage.py command line in this process and return its exit code and output.
+    Relative paths in it (--accounts, --file...) are resolved against `cwd`, the client's
+    working directory.
+    """
+    import manage
+
+    output = io.StringIO()
+    daemon_cwd = os.getcwd()
+    with redirect_stdout(output), redirect_stderr(output):
+        try:
+            args = manage.build_parser().parse_args(argv)
+            if not hasattr(args, "func") or getattr(args, "runs_locally", False):
+                print("the daemon can only run dydx subcommands")
+                return 2, output.getvalue()
+
+            if args.refresh_ip_check:
+                check_ip_location(ttl=0)
+            else:
+                check_ip_location()
+            # commands run one at a time, so they can have the working directory to
+            # themselves
+            if cwd:
+                os.chdir(cwd)
+            manage.run_command(args)
+            exit_code = 0
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else 1
+        except BadJurisdictionException as e:
+            print(e)
+            exit_code = 1
+        except Exception:
+            traceback.print_exc()
+            exit_code = 1
+        finally:
+            os.chdir(daemon_cwd)
+
+    return exit_code, output.getvalue()
+
+
+class _CommandHandler(socketserver.StreamRequestHandler):
+    # only for reading the request, it's cleared once the command line is in
+    timeout = REQUEST_TIMEOUT_SECONDS
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+        except (OSError, ValueError):
+            # timed out, disconnected or not a command line
+            return
+        self.connection.settimeout(None)
+        exit_code, output = execute(request["argv"], request.get("cwd"))
+        response = {"exit_code": exit_code, "output": output}
+        self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+
+def serve(args):
+    """
+    Serve forwarded commands on a unix socket, keeping imports, the KMS signer, web3
+    connections, HTTP sessions and the IP verdict warm between them.
+    Commands run one at a time since their output is captured by swapping sys.stdout.
+    """
+    from instrumentation import enable_metrics
+    from web3_provider import close_warm_web3, keep_web3_warm
+
+    socket_path = args.socket or DEFAULT_SOCKET_PATH
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    # read them with a forwarded `metrics` command
+    enable_metrics()
+    stop_reverification = start_background_reverification()
+    keep_web3_warm()
+
+    server = socketserver.UnixStreamServer(socket_path, _CommandHandler)
+    os.chmod(socket_path, 0o600)
+    print(f"Serving dydx commands on {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(socket_path)
+        stop_reverification.set()
+        close_warm_web3()
+
+
+def forward(socket_path: str, argv: List[str]) -> int:
+    """
+    Send a command line to a running daemon, print its output and return its exit code.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(socket_path)
+        request = {"argv": argv, "cwd": os.getcwd()}
+        s.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        with s.makefile("rb") as f:
+            response = json.loads(f.readline())
+
+    print(response["output"], end="")
+    return response["exit_code"]
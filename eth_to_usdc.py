@@ -1,9 +1,17 @@
 from utils import get_kms_signer
-from eulith_web3.signing import construct_signing_middleware
-from eulith_web3.eulith_web3 import EulithWeb3
 from credentials import *
 from eulith_web3.erc20 import TokenSymbol
-from eulith_web3.swap import EulithSwapRequest
+from fees import placeholder_fee_params, prepare_transaction
+from swap_engine import (
+    DEFAULT_MAX_CHUNKS,
+    best_split,
+    chunk_counts,
+    compare_splits,
+    execute_split,
+    print_splits,
+)
+from tx_pipeline import TxPipeline
+from web3_provider import open_web3
 
 
 def eth_to_usdc(parser_args):
@@ -15,25 +23,49 @@ def eth_to_usdc(parser_args):
         )
 
     kms_signer = get_kms_signer()
-    with EulithWeb3(
-        "https://eth-main.eulithrpc.com/v0",
-        eulith_token=EULITH_TOKEN,
-        signing_middle_ware=construct_signing_middleware(kms_signer),
-    ) as ew3:
+    with open_web3(kms_signer) as ew3:
         weth = ew3.v0.get_erc_token(TokenSymbol.WETH)
-        deposit_tx = weth.deposit_eth(
-            amount, {"from": kms_signer.address, "gas": 200000}
-        )
-        tx_hash = ew3.eth.send_transaction(deposit_tx)
-        print(f"Deposit tx hash {tx_hash.hex()} for amount: {amount} ETH")
-
         usdc = ew3.v0.get_erc_token(TokenSymbol.USDC)
 
-        swap_request = EulithSwapRequest(
-            sell_token=weth, buy_token=usdc, sell_amount=amount
+        chunks = parser_args.chunks or 1
+        if parser_args.auto_split or parser_args.dry_run:
+            # one quote per chunk size, all requested at once
+            max_chunks = parser_args.chunks or DEFAULT_MAX_CHUNKS
+            options = compare_splits(ew3, weth, usdc, amount, chunk_counts(max_chunks))
+            chosen = (
+                best_split(options)
+                if parser_args.auto_split
+                else next(o for o in options if o.chunks == chunks)
+            )
+            print_splits(options, chosen)
+            chunks = chosen.chunks
+            if parser_args.dry_run:
+                print(
+                    f"Would swap {amount} ETH in {chunks} chunk(s) at about "
+                    f"${1 / chosen.quote.price:.4f} for {chosen.buy_amount:.4f} USDC, "
+                    f"{chosen.slippage_bps:.1f}bp below the best chunk size's price"
+                )
+                return
+
+        deposit_tx = prepare_transaction(
+            ew3,
+            weth.deposit_eth(amount, placeholder_fee_params(ew3, kms_signer.address)),
         )
-        price, txs = ew3.v0.get_swap_quote(swap_request)
-        print(f"Swapping ETH to USDC at price: ${1 / price}")
-        ew3.v0.send_multi_transaction(txs)
+        with TxPipeline(ew3, kms_signer.address) as pipeline:
+            pending = pipeline.submit(deposit_tx, "wrap")
+            print(f"Deposit tx hash {pending.tx_hash} for amount: {amount} ETH")
+
+            # the first chunk is submitted right behind the wrap instead of waiting for it
+            # to be mined first
+            execute_split(
+                ew3,
+                pipeline,
+                kms_signer,
+                weth,
+                usdc,
+                amount,
+                chunks,
+                parser_args.interval,
+            )
 
         print("Done swapping ETH to USDC")
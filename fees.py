@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+import weakref
+
+from web3 import Web3
+from web3.exceptions import ContractLogicError
+
+# estimated gas is multiplied by this before being used as the gas limit
+GAS_SAFETY_MARGIN = float(os.environ.get("DYDX_TOOLS_GAS_MARGIN", "1.2"))
+FEE_HISTORY_BLOCKS = 10
+PRIORITY_FEE_PERCENTILE = 50
+# max fee = BASE_FEE_MULTIPLIER * next base fee + priority fee, which covers 6 consecutive
+# full blocks of base fee increases
+BASE_FEE_MULTIPLIER = 2
+# roughly one block, fees are re-read at most once per block
+FEE_HISTORY_TTL_SECONDS = 12
+
+# web3 instance -> (fetched at, fees)
+_fee_cache = weakref.WeakKeyDictionary()
+_fee_cache_lock = threading.Lock()
+
+_FEE_FIELDS = ("gas", "gasPrice", "maxFeePerGas", "maxPriorityFeePerGas")
+
+
+def _median(values):
+    values = sorted(values)
+    return values[len(values) // 2] if values else 0
+
+
+def suggest_fees(web3: Web3) -> dict:
+    """
+    EIP-1559 fee fields from recent fee history: the median priority fee paid over the last
+    FEE_HISTORY_BLOCKS blocks, on top of BASE_FEE_MULTIPLIER times the next block's base fee.
+    Cached per web3 instance for FEE_HISTORY_TTL_SECONDS.
+    """
+    with _fee_cache_lock:
+        cached = _fee_cache.get(web3)
+    if cached is not None and time.monotonic() - cached[0] < FEE_HISTORY_TTL_SECONDS:
+        return dict(cached[1])
+
+    history = web3.eth.fee_history(
+        FEE_HISTORY_BLOCKS, "latest", [PRIORITY_FEE_PERCENTILE]
+    )
+    # the last entry is the base fee of the next, not yet mined, block
+    next_base_fee = history["baseFeePerGas"][-1]
+    priority_fee = _median(
+        [r[0] for r in history.get("reward") or [] if r and r[0] > 0]
+    ) or web3.eth.max_priority_fee
+
+    fees = {
+        "maxFeePerGas": BASE_FEE_MULTIPLIER * next_base_fee + priority_fee,
+        "maxPriorityFeePerGas": priority_fee,
+    }
+    with _fee_cache_lock:
+        _fee_cache[web3] = (time.monotonic(), fees)
+    return dict(fees)
+
+
+def _reverted_for_allowance(e: Exception) -> bool:
+    if not isinstance(e, ContractLogicError):
+        return False
+    reason = str(e).partition("execution reverted")[2].strip(" :")
+    # some nodes drop the revert reason
+    return not reason or "allowance" in reason.lower()
+
+
+def _gas_limit(estimate, fallback_gas: int = None, margin: float = GAS_SAFETY_MARGIN):
+    try:
+        return int(estimate() * margin)
+    except ContractLogicError as e:
+        # only for transactions that can't be estimated yet, e.g. a deposit that depends on
+        # an approval that hasn't been mined; any other failure is real
+        if fallback_gas is None or not _reverted_for_allowance(e):
+            raise
+        return fallback_gas
+
+
+def prepare_transaction(
+    web3: Web3,
+    tx_params: dict,
+    fallback_gas: int = None,
+    margin: float = GAS_SAFETY_MARGIN,
+) -> dict:
+    """
+    Replace the gas limit and fee fields of an already built transaction with an estimate
+    (plus margin) and the suggested EIP-1559 fees.
+    """
+    tx = {k: v for k, v in tx_params.items() if k not in _FEE_FIELDS}
+    tx["gas"] = _gas_limit(lambda: web3.eth.estimate_gas(tx), fallback_gas, margin)
+    tx.update(suggest_fees(web3))
+    return tx
+
+
+def contract_transaction(
+    web3: Web3,
+    contract_function,
+    from_address: str,
+    fallback_gas: int = None,
+    margin: float = GAS_SAFETY_MARGIN,
+) -> dict:
+    """
+    Build a transaction for a bound contract function with an estimated gas limit (plus
+    margin) and the suggested EIP-1559 fees.
+    """
+    gas = _gas_limit(
+        lambda: contract_function.estimateGas({"from": from_address}),
+        fallback_gas,
+        margin,
+    )
+    return contract_function.buildTransaction(
+        {"from": from_address, "gas": gas, **suggest_fees(web3)}
+    )
+
+
+def placeholder_fee_params(web3: Web3, from_address: str) -> dict:
+    """
+    Fields to pass to third-party transaction builders so they skip their own fee lookups;
+    the result still needs prepare_transaction for its gas limit.
+    """
+    return {"from": from_address, **suggest_fees(web3)}
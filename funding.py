@@ -1,17 +1,24 @@
-from time import sleep
+import json
+from time import monotonic, sleep
 from typing import List
 
-from dydx3 import private_key_to_public_key_pair_hex
 from dydx3.constants import *
-from dydx3.helpers.request_helpers import random_client_id, iso_to_epoch_seconds
+from dydx3.helpers.request_helpers import (
+    generate_query_path,
+    random_client_id,
+    iso_to_epoch_seconds,
+)
 from dydx3.starkex.withdrawal import SignableWithdrawal
 from eulith_web3.erc20 import EulithERC20
-from eulith_web3.eulith_web3 import EulithWeb3
-from eulith_web3.signing import construct_signing_middleware
 
-from accounts import _get_account_internal
+from account_config import AccountConfig, default_account_config
+from abi_registry import get_contract
+from accounts import get_position_id, stark_public_key_pair
 from credentials import *
+from fees import contract_transaction, placeholder_fee_params, prepare_transaction
+from multicall import multicall
 from private_request import private_request
+from tx_pipeline import PendingTransaction, TxPipeline
 from utils import (
     get_exchange_contract_address,
     get_kms_signer,
@@ -19,6 +26,11 @@ from utils import (
     get_dydx_host,
     now_timestamp_plus_minutes,
 )
+from web3_provider import open_web3
+
+MAX_UINT256 = 2**256 - 1
+# gas limit for a deposit submitted before its approval is mined, when it can't be estimated
+DEPOSIT_FALLBACK_GAS = 200000
 
 
 def approve_exchange_contract(args):
@@ -31,33 +43,68 @@ def approve_exchange_contract(args):
     kms_signer = get_kms_signer()
     print(f"Executing from eth address: {kms_signer.address}")
 
-    with EulithWeb3(
-        "https://eth-main.eulithrpc.com/v0",
-        eulith_token=EULITH_TOKEN,
-        signing_middle_ware=construct_signing_middleware(kms_signer),
-    ) as ew3:
+    with open_web3(kms_signer) as ew3:
         usdc_address = "0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48"
         contract = EulithERC20(ew3, ew3.to_checksum_address(usdc_address))
         spender = get_exchange_contract_address(network_id)
 
-        approve_tx = contract.approve_float(
-            spender, amount, {"from": kms_signer.address, "gas": 200000}
+        approve_tx = prepare_transaction(
+            ew3,
+            contract.approve_float(
+                spender, amount, placeholder_fee_params(ew3, kms_signer.address)
+            ),
         )
-        tx_hash = ew3.eth.send_transaction(approve_tx)
-        print(f"Approve tx hash {tx_hash.hex()} for amount: {amount} USDC")
+        with TxPipeline(ew3, kms_signer.address) as pipeline:
+            pending = pipeline.submit(approve_tx, "approve")
+            print(f"Approve tx hash {pending.tx_hash} for amount: {amount} USDC")
+
+            receipt = pipeline.wait(pending)
+            print(f"Approve mined in block {receipt['blockNumber']}")
 
 
 def get_transfers(args):
+    # imported here, transfer_store builds on this module
+    from transfer_store import TransferStore
+
     network_id = int(args.network_id)
-    transfers = _get_transfers_internal(network_id)
+    store = TransferStore()
+    try:
+        if not args.no_sync:
+            store.sync(network_id)
+        transfers = store.query(
+            network_id,
+            since=args.since,
+            status=args.status,
+            transfer_type=args.type,
+        )
+    finally:
+        store.close()
+
     for t in transfers:
-        print(t)
+        print(json.dumps(t) if args.json else t)
 
 
-def _get_transfers_internal(network_id: int) -> List:
+def _get_transfers_internal(
+    network_id: int,
+    account: AccountConfig = None,
+    transfer_type: str = None,
+    limit: int = None,
+    created_before_or_at: str = None,
+) -> List:
+    account = account or default_account_config()
     host = get_dydx_host(network_id)
+    endpoint = generate_query_path(
+        "transfers",
+        {
+            "type": transfer_type,
+            "limit": limit,
+            "createdBeforeOrAt": created_before_or_at,
+        },
+    )
 
-    response = private_request(host, "get", "transfers")
+    response = private_request(
+        host, "get", endpoint, credentials=account.api_credentials
+    )
     return response.get("transfers")
 
 
@@ -65,45 +112,183 @@ def deposit_to_dydx(args):
     network_id = int(args.network_id)
     amount = float(args.amount)
 
+    result = _deposit_internal(network_id, amount, confirm=True)
+    print("Deposit confirmed by dydx:")
+    print(result["transfer"])
+
+
+def _deposit_internal(
+    network_id: int,
+    amount: float,
+    account: AccountConfig = None,
+    confirm: bool = False,
+) -> dict:
     if network_id != 1:
         raise Exception("unsupported network_id, can only deposit on mainnet")
 
-    kms_signer = get_kms_signer()
+    account = account or default_account_config()
+    kms_signer = get_kms_signer(
+        account.eth_signer_key_name, account.aws_credentials_profile_name
+    )
     print(f"Executing from eth address: {kms_signer.address}")
 
-    with EulithWeb3(
-        "https://eth-main.eulithrpc.com/v0",
-        eulith_token=EULITH_TOKEN,
-        signing_middle_ware=construct_signing_middleware(kms_signer),
-    ) as ew3:
-        contract = get_exchange_contract(network_id, ew3)
-
-        public_x, public_y = private_key_to_public_key_pair_hex(STARK_PRIVATE_KEY)
-        account = _get_account_internal(network_id)
-        position_id = account.get("positionId")
+    with open_web3(kms_signer) as ew3:
+        tx_params = _build_deposit_tx(
+            ew3, network_id, amount, account, kms_signer.address
+        )
 
-        tx_params = contract.functions.deposit(
+        with TxPipeline(ew3, kms_signer.address) as pipeline:
+            pending = pipeline.submit(tx_params, "deposit")
+            print(f"Deposit to DyDx tx hash: {pending.tx_hash}")
+
+            result = {"txHash": pending.tx_hash}
+            if confirm:
+                result["transfer"] = wait_for_deposit_confirmation(
+                    pipeline, pending, network_id, account
+                )
+            return result
+
+
+def _build_deposit_tx(
+    web3,
+    network_id: int,
+    amount: float,
+    account: AccountConfig,
+    from_address: str,
+    fallback_gas: int = None,
+) -> dict:
+    contract = get_exchange_contract(network_id, web3)
+
+    public_x, public_y = stark_public_key_pair(account.stark_private_key)
+    position_id = get_position_id(network_id, account)
+
+    return contract_transaction(
+        web3,
+        contract.functions.deposit(
             int(public_x, 16),
             COLLATERAL_ASSET_ID_BY_NETWORK_ID[network_id],
             int(position_id),
-            int(float(amount) * float(ASSET_RESOLUTION[COLLATERAL_ASSET])),
-        ).buildTransaction({"from": kms_signer.address, "gas": 200000})
+            _usdc_to_quantums(amount),
+        ),
+        from_address,
+        fallback_gas,
+    )
 
-        tx_hash = ew3.eth.send_transaction(tx_params)
-        print(f"Deposit to DyDx tx hash: {tx_hash.hex()}")
-        print()
 
-        print("Fetching transfers into dydx...")
-        attempt = 0
+def _usdc_to_quantums(amount: float) -> int:
+    return int(float(amount) * float(ASSET_RESOLUTION[COLLATERAL_ASSET]))
 
-        while attempt < 5:
-            attempt += 1
-            transfers = _get_transfers_internal(network_id)
-            if len(transfers) == 0:
-                sleep(2)
-                continue
+
+def fund(args):
+    """
+    Approve (only if the current allowance is too low) and deposit in one go. The allowance
+    and balance are read in a single multicall, and the deposit is submitted right behind the
+    approval instead of waiting for it to be mined.
+    """
+    network_id = int(args.network_id)
+    amount = float(args.amount)
+
+    if network_id != 1:
+        raise Exception("unsupported network_id, can only deposit on mainnet")
+
+    account = default_account_config()
+    kms_signer = get_kms_signer()
+    print(f"Executing from eth address: {kms_signer.address}")
+
+    with open_web3(kms_signer) as ew3:
+        usdc_address = TOKEN_CONTRACTS[COLLATERAL_ASSET][network_id]
+        usdc = get_contract(ew3, "erc20", ew3.to_checksum_address(usdc_address))
+        spender = get_exchange_contract_address(network_id)
+        quantums = _usdc_to_quantums(amount)
+
+        allowance, balance = multicall(
+            ew3,
+            [
+                usdc.functions.allowance(kms_signer.address, spender),
+                usdc.functions.balanceOf(kms_signer.address),
+            ],
+        )
+        print(
+            f"USDC balance: {balance / 10 ** COLLATERAL_TOKEN_DECIMALS}, "
+            f"allowance: {allowance / 10 ** COLLATERAL_TOKEN_DECIMALS}"
+        )
+        if balance < quantums:
+            raise Exception(f"insufficient USDC balance to deposit {amount} USDC")
+
+        with TxPipeline(ew3, kms_signer.address) as pipeline:
+            if allowance < quantums:
+                approve_amount = MAX_UINT256 if args.approve_max else quantums
+                approve_tx = contract_transaction(
+                    ew3,
+                    usdc.functions.approve(spender, approve_amount),
+                    kms_signer.address,
+                )
+                pending = pipeline.submit(approve_tx, "approve")
+                print(f"Approve tx hash: {pending.tx_hash}")
+                # the deposit can't be estimated until the approval is mined
+                deposit_fallback_gas = DEPOSIT_FALLBACK_GAS
             else:
-                print(transfers)
+                print("Existing allowance covers the deposit, skipping approval")
+                deposit_fallback_gas = None
+
+            deposit_tx = _build_deposit_tx(
+                ew3,
+                network_id,
+                amount,
+                account,
+                kms_signer.address,
+                deposit_fallback_gas,
+            )
+            pending = pipeline.submit(deposit_tx, "deposit")
+            print(f"Deposit to DyDx tx hash: {pending.tx_hash}")
+
+            # also raises if the approval reverted
+            pipeline.wait_all()
+            transfer = wait_for_deposit_confirmation(
+                pipeline, pending, network_id, account
+            )
+            print("Deposit confirmed by dydx:")
+            print(transfer)
+
+
+def wait_for_deposit_confirmation(
+    pipeline: TxPipeline,
+    pending: PendingTransaction,
+    network_id: int,
+    account: AccountConfig = None,
+    transfer_timeout: float = 300,
+    initial_delay: float = 1,
+    max_delay: float = 16,
+) -> dict:
+    """
+    Wait for the deposit to be mined, then poll dydx for the matching DEPOSIT transfer with
+    exponential backoff, returning the transfer as soon as it shows up.
+    """
+    print("Waiting for the deposit to be mined...")
+    receipt = pipeline.wait(pending)
+
+    print(f"Mined in block {receipt['blockNumber']}, waiting for dydx to see it...")
+    deadline = monotonic() + transfer_timeout
+    delay = initial_delay
+    # the deposit may have been re-broadcast with higher fees, match the one that was mined
+    tx_hash = receipt["transactionHash"].hex().lower()
+
+    while True:
+        # the deposit was just mined, so it's among the most recent deposits
+        transfers = _get_transfers_internal(
+            network_id, account, transfer_type="DEPOSIT", limit=10
+        )
+        for transfer in transfers:
+            if (transfer.get("transactionHash") or "").lower() == tx_hash:
+                return transfer
+
+        if monotonic() + delay > deadline:
+            raise Exception(
+                f"deposit {tx_hash} was mined but dydx has not reported it "
+                f"after {transfer_timeout} seconds"
+            )
+        sleep(delay)
+        delay = min(delay * 2, max_delay)
 
 
 def start_withdraw_from_dydx(args):
@@ -111,13 +296,36 @@ def start_withdraw_from_dydx(args):
     amount = int(args.amount)
     print(f"Withdrawing amount: {amount} USDC")
 
+    print("Withdraw response: ")
+    print(_start_withdraw_internal(network_id, amount))
+
+
+def _start_withdraw_internal(
+    network_id: int, amount: int, account: AccountConfig = None
+) -> dict:
+    account = account or default_account_config()
+    position_id = get_position_id(network_id, account)
+
+    params = build_withdrawal_params(
+        network_id, position_id, amount, account.stark_private_key
+    )
+
+    host = get_dydx_host(network_id)
+    return private_request(
+        host, "post", "withdrawals", params, credentials=account.api_credentials
+    )
+
+
+def build_withdrawal_params(
+    network_id: int, position_id, amount: int, stark_private_key: str
+) -> dict:
+    if not stark_private_key:
+        raise Exception("no stark private key given, can't sign the withdrawal")
+
     client_id = random_client_id()
     expiration = now_timestamp_plus_minutes(60 * 24 * 30)  # 30 days
     expiration_epoch_seconds = iso_to_epoch_seconds(expiration)
 
-    account = _get_account_internal(network_id)
-    position_id = account.get("positionId")
-
     withdrawal_to_sign = SignableWithdrawal(
         network_id=network_id,
         position_id=position_id,
@@ -125,9 +333,9 @@ def start_withdraw_from_dydx(args):
         human_amount=str(amount),
         expiration_epoch_seconds=expiration_epoch_seconds,
     )
-    signature = withdrawal_to_sign.sign(STARK_PRIVATE_KEY)
+    signature = withdrawal_to_sign.sign(stark_private_key)
 
-    params = {
+    return {
         "amount": str(amount),
         "asset": "USDC",
         "expiration": expiration,
@@ -135,30 +343,36 @@ def start_withdraw_from_dydx(args):
         "signature": signature,
     }
 
-    host = get_dydx_host(network_id)
-
-    print("Withdraw response: ")
-    print(private_request(host, "post", "withdrawals", params))
-
 
 def execute_withdraws(args):
     network_id = int(args.network_id)
     kms_signer = get_kms_signer()
 
-    with EulithWeb3(
-        "https://eth-main.eulithrpc.com/v0",
-        eulith_token=EULITH_TOKEN,
-        signing_middle_ware=construct_signing_middleware(kms_signer),
-    ) as ew3:
+    with open_web3(kms_signer) as ew3:
         contract = get_exchange_contract(network_id, ew3)
 
-        public_x, public_y = private_key_to_public_key_pair_hex(STARK_PRIVATE_KEY)
+        public_x, public_y = stark_public_key_pair(STARK_PRIVATE_KEY)
+        owner_key = int(public_x, 16)
+        asset_id = COLLATERAL_ASSET_ID_BY_NETWORK_ID[network_id]
+
+        withdrawable = contract.functions.getWithdrawalBalance(
+            owner_key, asset_id
+        ).call()
+        if withdrawable == 0:
+            print("Nothing to withdraw")
+            return
+        print(f"Withdrawable: {withdrawable / 10 ** COLLATERAL_TOKEN_DECIMALS} USDC")
+
+        tx_params = contract_transaction(
+            ew3,
+            contract.functions.withdraw(owner_key, asset_id),
+            kms_signer.address,
+        )
 
-        tx_params = contract.functions.withdraw(
-            int(public_x, 16),
-            COLLATERAL_ASSET_ID_BY_NETWORK_ID[network_id],
-        ).buildTransaction({"from": kms_signer.address, "gas": 200000})
+        with TxPipeline(ew3, kms_signer.address) as pipeline:
+            pending = pipeline.submit(tx_params, "withdraw")
+            print(f"Withdraw tx hash: {pending.tx_hash}")
 
-        tx_hash = ew3.eth.send_transaction(tx_params)
-        print(f"Withdraw tx hash: {tx_hash.hex()}")
+            receipt = pipeline.wait(pending)
+            print(f"Withdraw mined in block {receipt['blockNumber']}")
         print()
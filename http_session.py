@@ -0,0 +1,161 @@
+import json
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from dydx3.errors import DydxApiError
+from dydx3.helpers.request_helpers import remove_nones
+from dydx3.helpers.requests import Response
+from requests.adapters import HTTPAdapter
+
+from instrumentation import span
+from rate_limit import (
+    MAX_RETRIES,
+    RETRYABLE_STATUS_CODES,
+    get_bucket,
+    is_idempotent,
+    parse_retry_after,
+    retry_delay,
+)
+
+DEFAULT_POOL_SIZE = 10
+
+# Per-host connection pool sizes, keyed by scheme + host (e.g. "https://api.dydx.exchange").
+# Hosts not listed here use DEFAULT_POOL_SIZE.
+HOST_POOL_SIZES: Dict[str, int] = {
+    "https://api.dydx.exchange": 20,
+    "https://api.stage.dydx.exchange": 5,
+}
+
+DEFAULT_HEADERS = {
+    "Accept": "application/json",
+    "Content-Type": "application/json",
+    "User-Agent": "dydx/python",
+    "Connection": "keep-alive",
+}
+
+
+class SessionManager:
+    """
+    Holds one keep-alive requests.Session per host, each mounted with a connection pool sized
+    from HOST_POOL_SIZES. Request latency per endpoint is recorded as "dydx.request" spans.
+    """
+
+    def __init__(self, pool_sizes: Optional[Dict[str, int]] = None):
+        self._pool_sizes = dict(HOST_POOL_SIZES if pool_sizes is None else pool_sizes)
+        self._sessions: Dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    def set_pool_size(self, host: str, size: int):
+        with self._lock:
+            self._pool_sizes[host] = size
+            session = self._sessions.pop(host, None)
+        if session is not None:
+            session.close()
+
+    def session_for(self, host: str) -> requests.Session:
+        session = self._sessions.get(host)
+        if session is not None:
+            return session
+
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                size = self._pool_sizes.get(host, DEFAULT_POOL_SIZE)
+                session = requests.Session()
+                session.headers.update(DEFAULT_HEADERS)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size)
+                session.mount(host, adapter)
+                self._sessions[host] = session
+            return session
+
+    def send(self, uri: str, method: str, headers=None, **kwargs) -> requests.Response:
+        """
+        Send right away; callers wait for the rate limit first, see request().
+        """
+        parsed = urlparse(uri)
+        host = f"{parsed.scheme}://{parsed.netloc}"
+        endpoint = f"{method.upper()} {parsed.path}"
+
+        session = self.session_for(host)
+        with span("dydx.request", endpoint) as s:
+            response = session.request(method.upper(), uri, headers=headers, **kwargs)
+            if not str(response.status_code).startswith("2"):
+                s.set_error()
+        return response
+
+    def close(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+
+_session_manager = SessionManager()
+
+
+def get_session_manager() -> SessionManager:
+    return _session_manager
+
+
+def request(
+    uri, method, headers=None, data_values={}, api_timeout=None, idempotent=None
+) -> Response:
+    """
+    Drop-in replacement for dydx3.helpers.requests.request that goes through the shared,
+    pooled and rate limited session manager.
+
+    Idempotent calls (GETs unless `idempotent` says otherwise) are retried on connection
+    errors, 429s and 5xxs with jittered exponential backoff, honouring Retry-After. `headers`
+    may be a callable, it's then called for every attempt so signatures stay fresh.
+    `data_values` may also be an already encoded body, which is sent as is.
+    """
+    if idempotent is None:
+        idempotent = is_idempotent(method)
+    if isinstance(data_values, str):
+        data = data_values
+    else:
+        data = json.dumps(remove_nones(data_values))
+
+    bucket = get_bucket(method, urlparse(uri).path)
+    attempt = 0
+    while True:
+        # wait for the rate limit before signing, so the timestamp isn't stale when sent
+        bucket.acquire()
+        try:
+            response = _session_manager.send(
+                uri,
+                method,
+                headers() if callable(headers) else headers,
+                data=data,
+                timeout=api_timeout,
+            )
+        except requests.ConnectionError:
+            if not idempotent or attempt >= MAX_RETRIES:
+                raise
+            time.sleep(retry_delay(attempt))
+            attempt += 1
+            continue
+
+        if (
+            idempotent
+            and response.status_code in RETRYABLE_STATUS_CODES
+            and attempt < MAX_RETRIES
+        ):
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            time.sleep(retry_delay(attempt, retry_after))
+            attempt += 1
+            continue
+
+        break
+
+    if not str(response.status_code).startswith("2"):
+        raise DydxApiError(response)
+
+    if response.content:
+        return Response(response.json(), response.headers)
+    else:
+        return Response("{}", response.headers)
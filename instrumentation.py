@@ -0,0 +1,272 @@
+import atexit
+import os
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# latency histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRIC_PREFIX = "dydx_tools"
+
+# Prometheus textfile written at exit (e.g. for node_exporter's textfile collector)
+METRICS_FILE = os.environ.get("DYDX_TOOLS_METRICS_FILE")
+# also emit OpenTelemetry spans, through whatever tracer provider is configured
+OTEL_ENABLED = os.environ.get("DYDX_TOOLS_OTEL", "") not in ("", "0")
+
+
+class CallStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.bucket_counts = [0] * len(BUCKETS)
+
+    def record(self, elapsed: float, ok: bool):
+        self.count += 1
+        if not ok:
+            self.errors += 1
+        self.total_seconds += elapsed
+        self.max_seconds = max(self.max_seconds, elapsed)
+        for i, bound in enumerate(BUCKETS):
+            if elapsed <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+
+class Collector:
+    """
+    CallStats per (span name, target), e.g. ("dydx.request", "GET /v3/accounts").
+    """
+
+    def __init__(self):
+        self.stats: Dict[Tuple[str, Optional[str]], CallStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, target: Optional[str], elapsed: float, ok: bool):
+        with self._lock:
+            stats = self.stats.get((name, target))
+            if stats is None:
+                stats = self.stats[(name, target)] = CallStats()
+            stats.record(elapsed, ok)
+
+
+_metrics: Optional[Collector] = None
+# replaced rather than mutated, so spans can iterate it without the lock
+_profiles: Tuple[Collector, ...] = ()
+_tracer = None
+_state_lock = threading.Lock()
+# checked by every span, so that disabled instrumentation costs one global lookup
+_enabled = False
+
+
+def _refresh_enabled():
+    global _enabled
+    _enabled = _metrics is not None or bool(_profiles) or _tracer is not None
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set_error(self):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("name", "target", "ok", "_start", "_otel")
+
+    def __init__(self, name: str, target: Optional[str]):
+        self.name = name
+        self.target = target
+        self.ok = True
+        self._otel = None
+
+    def __enter__(self):
+        if _tracer is not None:
+            attributes = {"target": self.target} if self.target else None
+            self._otel = _tracer.start_as_current_span(self.name, attributes=attributes)
+            self._otel.__enter__()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._start
+        ok = self.ok and exc_type is None
+        metrics = _metrics
+        if metrics is not None:
+            metrics.record(self.name, self.target, elapsed, ok)
+        for collector in _profiles:
+            collector.record(self.name, self.target, elapsed, ok)
+        if self._otel is not None:
+            self._otel.__exit__(exc_type, exc, tb)
+        return False
+
+    def set_error(self):
+        """
+        Count the span as failed without raising, e.g. for a non-2xx response.
+        """
+        self.ok = False
+
+
+def span(name: str, target: Optional[str] = None):
+    """
+    Time a block as an external call: `with span("kms.sign", key_id): ...`. Exceptions
+    count as errors. A no-op unless metrics, a profile or OpenTelemetry is enabled.
+    """
+    if not _enabled:
+        return _NOOP_SPAN
+    return _Span(name, target)
+
+
+def enable_metrics():
+    """
+    Start collecting cumulative metrics for the rest of the process.
+    """
+    global _metrics
+    with _state_lock:
+        if _metrics is None:
+            _metrics = Collector()
+        _refresh_enabled()
+
+
+def enable_otel():
+    global _tracer
+    from opentelemetry import trace
+
+    with _state_lock:
+        _tracer = trace.get_tracer("dydx-tools")
+        _refresh_enabled()
+
+
+def render_prometheus() -> str:
+    """
+    The collected metrics in the Prometheus text exposition format.
+    """
+    if _metrics is None:
+        return ""
+
+    with _metrics._lock:
+        stats = sorted(
+            _metrics.stats.items(), key=lambda kv: (kv[0][0], kv[0][1] or "")
+        )
+        duration = f"{METRIC_PREFIX}_call_duration_seconds"
+        errors = f"{METRIC_PREFIX}_call_errors_total"
+        lines = [
+            f"# HELP {duration} Latency of external calls.",
+            f"# TYPE {duration} histogram",
+        ]
+        for (name, target), s in stats:
+            labels = _labels(name, target)
+            cumulative = 0
+            for bound, count in zip(BUCKETS, s.bucket_counts):
+                cumulative += count
+                lines.append(f'{duration}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{duration}_bucket{{{labels},le="+Inf"}} {s.count}')
+            lines.append(f"{duration}_sum{{{labels}}} {s.total_seconds}")
+            lines.append(f"{duration}_count{{{labels}}} {s.count}")
+
+        lines += [
+            f"# HELP {errors} External calls that raised or returned an error.",
+            f"# TYPE {errors} counter",
+        ]
+        for (name, target), s in stats:
+            lines.append(f"{errors}{{{_labels(name, target)}}} {s.errors}")
+    return "\n".join(lines) + "\n"
+
+
+def _labels(name: str, target: Optional[str]) -> str:
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return f'call="{escape(name)}",target="{escape(target or "")}"'
+
+
+def write_metrics(path: str):
+    from cache import write_atomic
+
+    write_atomic(os.path.abspath(path), render_prometheus().encode("utf-8"))
+
+
+def print_metrics(args):
+    """
+    Print the metrics collected so far; most useful when forwarded to the serve daemon.
+    """
+    print(render_prometheus(), end="")
+
+
+class Profile:
+    """
+    Per-phase timings for one command, see start_profile().
+    """
+
+    def __init__(self):
+        global _profiles
+        self.collector = Collector()
+        self.wall_seconds = None
+        self._start = time.perf_counter()
+        with _state_lock:
+            _profiles = _profiles + (self.collector,)
+            _refresh_enabled()
+
+    def stop(self):
+        global _profiles
+        if self.wall_seconds is not None:
+            return
+        self.wall_seconds = time.perf_counter() - self._start
+        with _state_lock:
+            _profiles = tuple(c for c in _profiles if c is not self.collector)
+            _refresh_enabled()
+
+    def print_breakdown(self):
+        self.stop()
+        wall_ms = 1000 * self.wall_seconds
+        stats = sorted(
+            self.collector.stats.items(), key=lambda kv: -kv[1].total_seconds
+        )
+
+        print(f"Profile, {wall_ms:.1f}ms wall time:")
+        print(
+            f"  {'phase':<48} {'calls':>6} {'errors':>6} {'total':>10} {'avg':>9} "
+            f"{'max':>9} {'wall':>6}"
+        )
+        accounted = 0.0
+        for (name, target), s in stats:
+            total_ms = 1000 * s.total_seconds
+            accounted += total_ms
+            phase = f"{name} {target}" if target else name
+            print(
+                f"  {phase:<48} {s.count:>6} {s.errors:>6} {total_ms:>8.1f}ms "
+                f"{total_ms / s.count:>7.1f}ms {1000 * s.max_seconds:>7.1f}ms "
+                f"{100 * total_ms / wall_ms:>5.1f}%"
+            )
+        # calls made concurrently can add up to more than the wall time
+        other_ms = max(wall_ms - accounted, 0.0)
+        print(
+            f"  {'other (local work)':<48} {'':>6} {'':>6} {other_ms:>8.1f}ms "
+            f"{'':>9} {'':>9} {100 * other_ms / wall_ms:>5.1f}%"
+        )
+
+
+def start_profile() -> Profile:
+    return Profile()
+
+
+if METRICS_FILE:
+    enable_metrics()
+    atexit.register(write_metrics, METRICS_FILE)
+if OTEL_ENABLED:
+    try:
+        enable_otel()
+    except ImportError:
+        print(
+            "DYDX_TOOLS_OTEL is set but opentelemetry is not installed, not tracing",
+            file=sys.stderr,
+        )
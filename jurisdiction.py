@@ -0,0 +1,189 @@
+import os
+import socket
+import struct
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+from cache import cache_path, read_json, write_json
+from exceptions import BadJurisdictionException
+from instrumentation import span
+
+IPINFO_URL = os.environ.get("DYDX_TOOLS_IPINFO_URL", "https://ipinfo.io/json")
+IP_CHECK_TIMEOUT_SECONDS = float(os.environ.get("DYDX_TOOLS_IP_CHECK_TIMEOUT", "5"))
+JURISDICTION_CACHE_TTL_SECONDS = float(
+    os.environ.get("DYDX_TOOLS_IP_CHECK_TTL", str(15 * 60))
+)
+JURISDICTION_CACHE_PATH = cache_path("jurisdiction.json")
+
+
+def ipinfo_resolver(timeout: float) -> dict:
+    import requests
+
+    response = requests.get(IPINFO_URL, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+_resolver: Callable[[float], dict] = ipinfo_resolver
+_cache_lock = threading.Lock()
+_background_failure: Optional[Exception] = None
+
+
+def set_ip_resolver(resolver: Callable[[float], dict]):
+    """
+    Replace the IP lookup, e.g. with a local stand-in for tests. The resolver takes a timeout
+    in seconds and returns an ipinfo-style dict with at least "ip" and "timezone".
+    """
+    global _resolver
+    _resolver = resolver
+
+
+def _local_address() -> Optional[str]:
+    # connecting a UDP socket sends no packets but makes the OS pick the outbound address
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect(("1.1.1.1", 53))
+            return s.getsockname()[0]
+    except OSError:
+        return None
+
+
+def _default_gateway() -> Optional[Tuple[str, str]]:
+    """
+    (interface, gateway IP) of the default IPv4 route, from the Linux routing table.
+    """
+    try:
+        with open("/proc/net/route") as f:
+            rows = [line.split() for line in f.readlines()[1:]]
+    except OSError:
+        return None
+
+    defaults = [r for r in rows if len(r) > 6 and r[1] == "00000000"]
+    if not defaults:
+        return None
+    # columns: Iface Destination Gateway Flags RefCnt Use Metric ...
+    route = min(defaults, key=lambda r: int(r[6]))
+    # addresses are hex in host (little-endian) byte order
+    gateway = socket.inet_ntoa(struct.pack("<L", int(route[2], 16)))
+    return route[0], gateway
+
+
+def _hardware_address(ip: str, iface: str) -> Optional[str]:
+    try:
+        with open("/proc/net/arp") as f:
+            for line in f.readlines()[1:]:
+                fields = line.split()
+                if len(fields) >= 6 and fields[0] == ip and fields[5] == iface:
+                    mac = fields[3]
+                    return None if mac == "00:00:00:00:00:00" else mac
+    except OSError:
+        pass
+    return None
+
+
+def network_key() -> Optional[str]:
+    """
+    Identify the network we're egressing through without a round-trip: the default route's
+    interface and the gateway's MAC address, plus the local address. A private LAN address
+    alone says nothing about the egress, the same one turns up on other networks.
+
+    None when the network can't be told apart, e.g. off Linux or through a point-to-point
+    VPN interface with no gateway MAC; verdicts are then never reused.
+    """
+    gateway = _default_gateway()
+    if gateway is None:
+        return None
+    iface, gateway_ip = gateway
+    mac = _hardware_address(gateway_ip, iface)
+    if mac is None:
+        return None
+    return f"{iface}|{mac}|{_local_address()}"
+
+
+def _verdict(info: dict) -> dict:
+    timezone = info.get("timezone")
+    if not timezone:
+        raise Exception("IP lookup did not return a timezone")
+
+    return {
+        "ip": info.get("ip"),
+        "timezone": timezone,
+        "allowed": "Europe" in timezone,
+        "checked_at": time.time(),
+    }
+
+
+def _raise_if_blocked(verdict: dict):
+    if not verdict["allowed"]:
+        raise BadJurisdictionException(
+            "If you make a request from a blocked jurisdiction, "
+            "dydx will permanently ban you and shut down your account. "
+            "Shutting down now to prevent this."
+        )
+
+
+def verify_now(timeout: float = IP_CHECK_TIMEOUT_SECONDS) -> dict:
+    """
+    Look up the current IP location, bypassing the cache, and store the verdict.
+    """
+    with span("ipinfo.lookup"):
+        info = _resolver(timeout)
+    verdict = _verdict(info)
+    key = network_key()
+    if key is not None:
+        with _cache_lock:
+            cache = read_json(JURISDICTION_CACHE_PATH, {})
+            cache[key] = verdict
+            write_json(JURISDICTION_CACHE_PATH, cache)
+    return verdict
+
+
+def check_ip_location(
+    ttl: float = JURISDICTION_CACHE_TTL_SECONDS,
+    timeout: float = IP_CHECK_TIMEOUT_SECONDS,
+):
+    """
+    Raise unless we are calling from an allowed jurisdiction. A verdict is reused for `ttl`
+    seconds on the same network (see network_key); anything that prevents a verdict
+    (timeouts, bad responses) raises, and so does a failed background re-verification.
+    """
+    if _background_failure is not None:
+        raise _background_failure
+
+    verdict = None
+    key = network_key() if ttl > 0 else None
+    if key is not None:
+        verdict = read_json(JURISDICTION_CACHE_PATH, {}).get(key)
+        if verdict is not None and time.time() - verdict.get("checked_at", 0) > ttl:
+            verdict = None
+
+    if verdict is None:
+        verdict = verify_now(timeout)
+
+    _raise_if_blocked(verdict)
+
+
+def start_background_reverification(
+    interval: float = JURISDICTION_CACHE_TTL_SECONDS / 2,
+    timeout: float = IP_CHECK_TIMEOUT_SECONDS,
+) -> threading.Event:
+    """
+    For long-running processes: re-verify every `interval` seconds on a daemon thread so that
+    check_ip_location stays a cache hit. If a re-verification fails or comes back blocked,
+    check_ip_location raises until a later re-verification succeeds. Set the returned event to
+    stop.
+    """
+    stop = threading.Event()
+
+    def run():
+        global _background_failure
+        while not stop.wait(interval):
+            try:
+                _raise_if_blocked(verify_now(timeout))
+                _background_failure = None
+            except Exception as e:
+                _background_failure = e
+
+    threading.Thread(target=run, name="jurisdiction-reverify", daemon=True).start()
+    return stop
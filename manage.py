@@ -1,16 +1,7 @@
 import argparse
-
-from accounts import get_account, register_user, show_wallet, create_user
-from eth_to_usdc import eth_to_usdc
-from exceptions import BadJurisdictionException
-from funding import (
-    approve_exchange_contract,
-    get_transfers,
-    deposit_to_dydx,
-    start_withdraw_from_dydx,
-    execute_withdraws,
-)
-from utils import check_ip_location
+import importlib
+import os
+import sys
 
 """
 To create and fund a new DyDx account, you must do the following:
@@ -23,15 +14,102 @@ To create and fund a new DyDx account, you must do the following:
 """
 
 
-def main():
+def lazy_handler(module_name: str, function_name: str):
+    """
+    Defer importing a subcommand's module until it runs, so that each command only pays for
+    the imports it needs (and --help pays for none of them).
+    """
+
+    def handler(args):
+        module = importlib.import_module(module_name)
+        return getattr(module, function_name)(args)
+
+    handler.module_name = module_name
+    handler.function_name = function_name
+    return handler
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(prog="dydx management cli")
-    subparsers = parser.add_subparsers(help="all available dydx commands")
+    parser.add_argument(
+        "--profile",
+        help="print a per-phase breakdown of where the command spent its time, "
+        "including latency per HTTP endpoint and RPC method",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--refresh-ip-check",
+        help="ignore the cached IP location verdict and look it up again",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--daemon-socket",
+        help="forward the command to a `serve` daemon listening on this unix socket",
+        default=os.environ.get("DYDX_TOOLS_DAEMON_SOCKET"),
+    )
+    parser.add_argument(
+        "--accounts",
+        help="path to a JSON/YAML accounts manifest, runs the command for every account",
+    )
+    parser.add_argument(
+        "--workers",
+        help="number of parallel workers when running with --accounts",
+        type=int,
+        default=8,
+    )
+    parser.add_argument(
+        "--pool",
+        help="worker pool type when running with --accounts",
+        choices=["thread", "process"],
+        default="thread",
+    )
+    parser.add_argument(
+        "--output",
+        help="output format when running with --accounts",
+        choices=["table", "jsonl"],
+        default="table",
+    )
+    subparsers = parser.add_subparsers(
+        dest="command", help="all available dydx commands"
+    )
+
+    #### serve ####
+    parser_serve = subparsers.add_parser(
+        "serve",
+        help="run a daemon that keeps clients warm and executes forwarded commands",
+    )
+    parser_serve.add_argument(
+        "--socket", help="unix socket path to listen on (defaults to the cache dir)"
+    )
+    parser_serve.set_defaults(func=lazy_handler("daemon", "serve"), runs_locally=True)
 
     #### show-wallet ####
     parser_show_wallet = subparsers.add_parser(
         "show-wallet", help="get the details of the configured eth wallet"
     )
-    parser_show_wallet.set_defaults(func=show_wallet)
+    parser_show_wallet.set_defaults(func=lazy_handler("wallet", "show_wallet"))
+
+    #### clear-signer-cache ####
+    parser_clear_signer_cache = subparsers.add_parser(
+        "clear-signer-cache",
+        help="forget the cached address of the configured KMS key",
+    )
+    parser_clear_signer_cache.set_defaults(func=lazy_handler("wallet", "clear_signer_cache"))
+
+    #### metrics ####
+    parser_metrics = subparsers.add_parser(
+        "metrics",
+        help="print the collected call metrics in the Prometheus text format "
+        "(use with --daemon-socket)",
+    )
+    parser_metrics.set_defaults(func=lazy_handler("instrumentation", "print_metrics"))
 
     #### create-user ####
     parser_create_user = subparsers.add_parser(
@@ -40,7 +118,19 @@ def main():
     parser_create_user.add_argument(
         "--network-id", help="the dydx network id (either 1 or 11155111)", required=True
     )
-    parser_create_user.set_defaults(func=create_user)
+    parser_create_user.set_defaults(func=lazy_handler("accounts", "create_user"))
+
+    #### create-api-key ####
+    parser_create_api_key = subparsers.add_parser(
+        "create-api-key", help="create new dydx API keys, e.g. to rotate them"
+    )
+    parser_create_api_key.add_argument(
+        "--network-id", help="the dydx network id (either 1 or 11155111)", required=True
+    )
+    parser_create_api_key.add_argument(
+        "--count", help="how many keys to create", type=int, default=1
+    )
+    parser_create_api_key.set_defaults(func=lazy_handler("accounts", "create_api_key"))
 
     #### approve-dydx-exchange ####
     parser_greet = subparsers.add_parser(
@@ -53,7 +143,7 @@ def main():
     parser_greet.add_argument(
         "--amount", help="the amount of USDC to approve", required=True
     )
-    parser_greet.set_defaults(func=approve_exchange_contract)
+    parser_greet.set_defaults(func=lazy_handler("funding", "approve_exchange_contract"))
 
     #### eth-to-usdc ####
     parser_greet = subparsers.add_parser(
@@ -66,7 +156,28 @@ def main():
     parser_greet.add_argument(
         "--amount", help="the amount of USDC to approve", required=True
     )
-    parser_greet.set_defaults(func=eth_to_usdc)
+    parser_greet.add_argument(
+        "--chunks",
+        help="swap in this many equal chunks (with --auto-split, the most to consider)",
+        type=positive_int,
+    )
+    parser_greet.add_argument(
+        "--auto-split",
+        help="quote several chunk counts and use the best after gas",
+        action="store_true",
+    )
+    parser_greet.add_argument(
+        "--interval",
+        help="seconds between chunks, for a TWAP",
+        type=float,
+        default=0,
+    )
+    parser_greet.add_argument(
+        "--dry-run",
+        help="only report expected prices and slippage per chunk count",
+        action="store_true",
+    )
+    parser_greet.set_defaults(func=lazy_handler("eth_to_usdc", "eth_to_usdc"))
 
     #### get-account ####
     parser_get_account = subparsers.add_parser(
@@ -75,7 +186,18 @@ def main():
     parser_get_account.add_argument(
         "--network-id", help="the dydx network id (either 1 or 11155111)", required=True
     )
-    parser_get_account.set_defaults(func=get_account)
+    parser_get_account.set_defaults(func=lazy_handler("accounts", "get_account"))
+
+    #### status ####
+    parser_status = subparsers.add_parser(
+        "status",
+        help="wallet balances, exchange allowance, withdrawable balance and the dydx account",
+    )
+    parser_status.add_argument(
+        "--network-id", help="the dydx network id (either 1 or 11155111)", required=True
+    )
+    parser_status.add_argument("--json", help="print as JSON", action="store_true")
+    parser_status.set_defaults(func=lazy_handler("status", "show_status"))
 
     #### get-transfers ####
     parser_get_account = subparsers.add_parser(
@@ -84,7 +206,44 @@ def main():
     parser_get_account.add_argument(
         "--network-id", help="the dydx network id (either 1 or 11155111)", required=True
     )
-    parser_get_account.set_defaults(func=get_transfers)
+    parser_get_account.add_argument(
+        "--since", help="only transfers created at or after this ISO timestamp"
+    )
+    parser_get_account.add_argument(
+        "--status", help="only transfers with this status, e.g. PENDING or CONFIRMED"
+    )
+    parser_get_account.add_argument(
+        "--type", help="only transfers of this type, e.g. DEPOSIT or WITHDRAWAL"
+    )
+    parser_get_account.add_argument(
+        "--json", help="print one JSON object per line", action="store_true"
+    )
+    parser_get_account.add_argument(
+        "--no-sync",
+        help="only read the local transfer store, don't fetch new transfers",
+        action="store_true",
+    )
+    parser_get_account.set_defaults(func=lazy_handler("funding", "get_transfers"))
+
+    #### watch ####
+    parser_watch = subparsers.add_parser(
+        "watch",
+        help="stream account, position and transfer updates until interrupted",
+    )
+    parser_watch.add_argument(
+        "--network-id", help="the dydx network id (either 1 or 11155111)", required=True
+    )
+    parser_watch.add_argument(
+        "--kind",
+        help="only print updates of this kind (repeatable)",
+        action="append",
+        choices=["account", "position", "transfer", "order", "fill", "funding"],
+    )
+    parser_watch.add_argument(
+        "--json", help="print one JSON object per line", action="store_true"
+    )
+    # streams until interrupted, so it's never forwarded to the daemon
+    parser_watch.set_defaults(func=lazy_handler("account_stream", "watch"), runs_locally=True)
 
     #### register-user ####
     parser_register_user = subparsers.add_parser(
@@ -93,7 +252,7 @@ def main():
     parser_register_user.add_argument(
         "--network-id", help="the dydx network id (either 1 or 11155111)", required=True
     )
-    parser_register_user.set_defaults(func=register_user)
+    parser_register_user.set_defaults(func=lazy_handler("accounts", "register_user"))
 
     #### deposit-dydx ####
     parser_deposit_dydx = subparsers.add_parser(
@@ -105,7 +264,25 @@ def main():
     parser_deposit_dydx.add_argument(
         "--amount", help="the amount of USDC to deposit", required=True
     )
-    parser_deposit_dydx.set_defaults(func=deposit_to_dydx)
+    parser_deposit_dydx.set_defaults(func=lazy_handler("funding", "deposit_to_dydx"))
+
+    #### fund ####
+    parser_fund = subparsers.add_parser(
+        "fund",
+        help="approve USDC (only if the allowance is too low) and deposit it into dydx",
+    )
+    parser_fund.add_argument(
+        "--network-id", help="the dydx network id (either 1 or 11155111)", required=True
+    )
+    parser_fund.add_argument(
+        "--amount", help="the amount of USDC to deposit", required=True
+    )
+    parser_fund.add_argument(
+        "--approve-max",
+        help="approve an unlimited amount when an approval is needed",
+        action="store_true",
+    )
+    parser_fund.set_defaults(func=lazy_handler("funding", "fund"))
 
     #### start-withdraw-dydx ####
     parser_withdraw = subparsers.add_parser(
@@ -117,7 +294,29 @@ def main():
     parser_withdraw.add_argument(
         "--amount", help="the amount of USDC to withdraw", required=True
     )
-    parser_withdraw.set_defaults(func=start_withdraw_from_dydx)
+    parser_withdraw.set_defaults(func=lazy_handler("funding", "start_withdraw_from_dydx"))
+
+    #### batch-withdraw ####
+    parser_batch_withdraw = subparsers.add_parser(
+        "batch-withdraw",
+        help="initiate many fast withdraws in USDC from dydx, across accounts from --accounts",
+    )
+    parser_batch_withdraw.add_argument(
+        "--network-id", help="the dydx network id (either 1 or 11155111)", required=True
+    )
+    parser_batch_withdraw.add_argument(
+        "--amount",
+        help="an amount of USDC to withdraw from every account, may be repeated",
+        action="append",
+    )
+    parser_batch_withdraw.add_argument(
+        "--file",
+        help='JSON list of {"account": <manifest name>, "amount": <USDC>} withdrawals',
+    )
+    parser_batch_withdraw.set_defaults(
+        func=lazy_handler("batch_withdraw", "start_batch_withdraw"),
+        handles_accounts=True,
+    )
 
     #### execute-withdraws ####
     parser_execute_withdraws = subparsers.add_parser(
@@ -126,22 +325,129 @@ def main():
     parser_execute_withdraws.add_argument(
         "--network-id", help="the dydx network id (either 1 or 11155111)", required=True
     )
-    parser_execute_withdraws.set_defaults(func=execute_withdraws)
+    parser_execute_withdraws.set_defaults(func=lazy_handler("funding", "execute_withdraws"))
+
+    #### sweep-withdraws ####
+    parser_sweep = subparsers.add_parser(
+        "sweep-withdraws",
+        help="keep claiming withdrawable USDC from the exchange contract when worth the gas",
+    )
+    parser_sweep.add_argument(
+        "--network-id", help="the dydx network id (either 1 or 11155111)", required=True
+    )
+    parser_sweep.add_argument(
+        "--interval",
+        help="average seconds between sweeps, jittered by 20%%",
+        type=float,
+        default=600,
+    )
+    parser_sweep.add_argument(
+        "--gas-cost-multiple",
+        help="only claim when the amount is at least this many times the gas cost",
+        type=float,
+        default=10,
+    )
+    parser_sweep.add_argument(
+        "--min-amount", help="only claim at least this much USDC", type=float, default=0
+    )
+    parser_sweep.add_argument(
+        "--dry-run", help="report what would be claimed, don't send", action="store_true"
+    )
+    parser_sweep.add_argument("--once", help="sweep once and exit", action="store_true")
+    # loops until interrupted, so it's never forwarded to the daemon; reads --accounts itself
+    parser_sweep.set_defaults(
+        func=lazy_handler("sweep", "sweep_withdraws"),
+        handles_accounts=True,
+        runs_locally=True,
+    )
+
+    return parser
+
+
+def main():
+    parser = build_parser()
 
     # Parse the arguments
     args = parser.parse_args()
 
-    # Execute the function associated with the chosen subcommand
-    if hasattr(args, "func"):
-        args.func(args)
-    else:
+    if not hasattr(args, "func"):
         parser.print_help()
+        return
 
+    if args.daemon_socket and not getattr(args, "runs_locally", False):
+        from daemon import forward
+
+        exit(forward(args.daemon_socket, sys.argv[1:]))
+
+    profile = None
+    if args.profile:
+        from instrumentation import start_profile
+
+        # started here so the IP check shows up too
+        profile = start_profile()
+
+    verify_ip_location(refresh=args.refresh_ip_check)
+    run_command(args, profile)
+
+
+def run_command(args, profile=None):
+    if args.profile and profile is None:
+        from instrumentation import start_profile
+
+        profile = start_profile()
+
+    # Execute the function associated with the chosen subcommand
+    try:
+        if args.accounts and not getattr(args, "handles_accounts", False):
+            run_for_accounts(args)
+        else:
+            args.func(args)
+    finally:
+        if profile is not None:
+            print()
+            profile.print_breakdown()
+
+
+def run_for_accounts(args):
+    from account_config import load_accounts_manifest
+    from batch import print_batch_results, run_batch
+
+    accounts = load_accounts_manifest(args.accounts)
+    command_args = {
+        k: v
+        for k, v in vars(args).items()
+        if k
+        not in (
+            "func",
+            "accounts",
+            "workers",
+            "pool",
+            "output",
+            "profile",
+            "refresh_ip_check",
+            "daemon_socket",
+        )
+    }
+    results = run_batch(
+        args.command,
+        command_args,
+        accounts,
+        workers=args.workers,
+        use_processes=args.pool == "process",
+    )
+    print_batch_results(results, args.output)
+
+
+def verify_ip_location(refresh: bool = False):
+    from exceptions import BadJurisdictionException
+    from jurisdiction import check_ip_location
 
-if __name__ == "__main__":
     try:
         print("Checking whether you're calling from a safe IP location...")
-        check_ip_location()
+        if refresh:
+            check_ip_location(ttl=0)
+        else:
+            check_ip_location()
         print("Looks good, proceeding.")
         print()
     except BadJurisdictionException as e:
@@ -153,4 +459,6 @@ if __name__ == "__main__":
         )
         exit(1)
 
+
+if __name__ == "__main__":
     main()
@@ -0,0 +1,34 @@
+from typing import Any, List
+
+from web3 import Web3
+from web3._utils.abi import get_abi_output_types
+
+from abi_registry import get_contract
+
+# Multicall3 is deployed at the same address on mainnet and every major testnet
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+
+def get_multicall(web3: Web3):
+    return get_contract(web3, "multicall3", MULTICALL3_ADDRESS)
+
+
+def multicall(web3: Web3, calls: List, allow_failure: bool = False) -> List[Any]:
+    """
+    Execute several contract view calls (bound ContractFunctions, e.g.
+    `usdc.functions.balanceOf(owner)`) in a single eth_call through Multicall3 and return
+    their decoded results in order. Single-value outputs are unwrapped. With `allow_failure`,
+    a failed call yields None instead of reverting the whole batch.
+    """
+    aggregate = get_multicall(web3).functions.aggregate3(
+        [(call.address, allow_failure, call._encode_transaction_data()) for call in calls]
+    )
+
+    results = []
+    for call, (success, return_data) in zip(calls, aggregate.call()):
+        if not success:
+            results.append(None)
+            continue
+        decoded = web3.codec.decode_abi(get_abi_output_types(call.abi), return_data)
+        results.append(decoded[0] if len(decoded) == 1 else decoded)
+    return results
@@ -1,43 +1,136 @@
 import base64
 import hashlib
 import hmac
+import time
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple
 
-from dydx3.helpers.request_helpers import generate_now_iso, json_stringify
+from dydx3.helpers.request_helpers import json_stringify
 from dydx3.helpers.request_helpers import remove_nones
-from dydx3.helpers.requests import request
 from credentials import *
+from http_session import request
+
+EMPTY_BODY = "{}"
+
+# (epoch second, "YYYY-MM-DDTHH:MM:SS") of the last timestamp generated
+_timestamp_prefix = (None, "")
+
+
+class ApiCredentials(NamedTuple):
+    api_key: str
+    api_secret: str
+    api_passphrase: str
+
+
+def default_api_credentials() -> ApiCredentials:
+    return ApiCredentials(API_KEY, API_SECRET, API_PASSPHRASE)
+
+
+def encode_body(data: dict) -> str:
+    """
+    The canonical (compact) JSON body for `data`; these exact bytes are both signed and sent.
+    """
+    return json_stringify(remove_nones(data)) if data else EMPTY_BODY
+
+
+def now_iso() -> str:
+    """
+    Same format as dydx3's generate_now_iso, but only formats the date once per second.
+    """
+    global _timestamp_prefix
+    now = time.time()
+    second = int(now)
+    if _timestamp_prefix[0] != second:
+        _timestamp_prefix = (
+            second,
+            time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second)),
+        )
+    return "%s.%03dZ" % (_timestamp_prefix[1], int((now - second) * 1000))
+
+
+class RequestSigner:
+    """
+    Signs private requests for one set of API credentials. The secret is decoded and the HMAC
+    keyed once; each signature only copies the keyed HMAC and feeds it the message.
+    """
+
+    def __init__(self, credentials: ApiCredentials):
+        self.credentials = credentials
+        self._hmac = hmac.new(
+            base64.urlsafe_b64decode(credentials.api_secret.encode("utf-8")),
+            digestmod=hashlib.sha256,
+        )
+
+    def sign(self, request_path: str, method: str, iso_timestamp: str, body: str) -> str:
+        # an empty body isn't part of the signed message
+        message_string = (
+            iso_timestamp + method + request_path + (body if body != EMPTY_BODY else "")
+        )
+        hashed = self._hmac.copy()
+        hashed.update(message_string.encode("utf-8"))
+        return base64.urlsafe_b64encode(hashed.digest()).decode()
+
+    def headers(self, request_path: str, method: str, body: str) -> dict:
+        now_iso_string = now_iso()
+        return {
+            "DYDX-SIGNATURE": self.sign(
+                request_path, method.upper(), now_iso_string, body
+            ),
+            "DYDX-API-KEY": self.credentials.api_key,
+            "DYDX-TIMESTAMP": now_iso_string,
+            "DYDX-PASSPHRASE": self.credentials.api_passphrase,
+        }
+
+
+@lru_cache(maxsize=None)
+def get_request_signer(credentials: Optional[ApiCredentials] = None) -> RequestSigner:
+    return RequestSigner(credentials or default_api_credentials())
 
 
 def generate_request_signature(
-    request_path: str, method: str, iso_timestamp: str, data: dict
+    request_path: str,
+    method: str,
+    iso_timestamp: str,
+    data: dict,
+    api_secret: Optional[str] = None,
 ) -> str:
-    message_string = (
-        iso_timestamp + method + request_path + (json_stringify(data) if data else "")
+    credentials = ApiCredentials("", api_secret or API_SECRET, "")
+    return get_request_signer(credentials).sign(
+        request_path, method, iso_timestamp, encode_body(data)
     )
 
-    hashed = hmac.new(
-        base64.urlsafe_b64decode(API_SECRET.encode("utf-8")),
-        msg=message_string.encode("utf-8"),
-        digestmod=hashlib.sha256,
-    )
-    return base64.urlsafe_b64encode(hashed.digest()).decode()
 
+def signed_request(
+    request_path: str,
+    method: str,
+    data: dict,
+    credentials: Optional[ApiCredentials] = None,
+) -> Tuple[str, dict]:
+    """
+    The encoded body and freshly signed headers for a private request.
+    """
+    body = encode_body(data)
+    return body, get_request_signer(credentials).headers(request_path, method, body)
+
+
+def private_headers(
+    request_path: str,
+    method: str,
+    data: dict,
+    credentials: Optional[ApiCredentials] = None,
+) -> dict:
+    return signed_request(request_path, method, data, credentials)[1]
 
-def private_request(host, method, endpoint, data={}):
-    now_iso_string = generate_now_iso()
+
+def private_request(
+    host, method, endpoint, data={}, credentials: Optional[ApiCredentials] = None
+):
     request_path = "/".join(["/v3", endpoint])
-    signature = generate_request_signature(
-        request_path=request_path,
-        method=method.upper(),
-        iso_timestamp=now_iso_string,
-        data=remove_nones(data),
-    )
+    signer = get_request_signer(credentials)
+    body = encode_body(data)
 
-    headers = {
-        "DYDX-SIGNATURE": signature,
-        "DYDX-API-KEY": API_KEY,
-        "DYDX-TIMESTAMP": now_iso_string,
-        "DYDX-PASSPHRASE": API_PASSPHRASE,
-    }
+    # re-signed on every attempt, so retries don't send a stale timestamp
+    def headers():
+        return signer.headers(request_path, method, body)
 
-    return request(host + request_path, method, headers, data, 30).data
+    return request(host + request_path, method, headers, body, 30).data
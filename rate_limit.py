@@ -0,0 +1,108 @@
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+# (requests, per seconds), mirroring dYdX's documented v3 limits. Keys are (method, path);
+# a None path is the default for that method, and (None, None) the default for everything.
+ENDPOINT_RATE_LIMITS: Dict[Tuple[Optional[str], Optional[str]], Tuple[int, float]] = {
+    (None, None): (175, 10),
+    ("POST", "/v3/onboarding"): (2, 10),
+    ("POST", "/v3/api-keys"): (2, 10),
+    ("POST", "/v3/withdrawals"): (10, 60),
+    ("POST", "/v3/fast-withdrawals"): (10, 60),
+}
+
+MAX_RETRIES = 4
+RETRY_BASE_DELAY_SECONDS = 0.5
+RETRY_MAX_DELAY_SECONDS = 30
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class TokenBucket:
+    """
+    A token bucket usable from threads and asyncio tasks alike: callers reserve a token
+    (the balance may go negative) and then wait out the time until it's theirs.
+    """
+
+    def __init__(self, requests: int, per_seconds: float):
+        self.capacity = requests
+        self.rate = requests / per_seconds
+        self._tokens = float(requests)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated_at) * self.rate
+            )
+            self._updated_at = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+_buckets: Dict[Tuple[Optional[str], Optional[str]], TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(method: str, path: str) -> TokenBucket:
+    """
+    The bucket shared by every request to this endpoint, falling back to the method-wide and
+    then the global budget when the endpoint has no limit of its own.
+    """
+    method = method.upper()
+    for key in ((method, path), (method, None), (None, None)):
+        if key in ENDPOINT_RATE_LIMITS:
+            break
+
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = _buckets[key] = TokenBucket(*ENDPOINT_RATE_LIMITS[key])
+        return bucket
+
+
+def is_idempotent(method: str) -> bool:
+    return method.upper() in IDEMPOTENT_METHODS
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Retry-After is either a number of seconds or an HTTP date.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    Seconds to wait before retry number `attempt` (0-based): the server's Retry-After when
+    given, otherwise exponential backoff with full jitter.
+    """
+    if retry_after is not None:
+        return min(retry_after, RETRY_MAX_DELAY_SECONDS)
+    cap = min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * 2**attempt)
+    return random.uniform(0, cap)
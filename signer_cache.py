@@ -0,0 +1,178 @@
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from cache import cache_path, read_json, write_json
+from instrumentation import span
+from signing_pool import SIGNING_WORKERS
+from credentials import *
+
+if TYPE_CHECKING:
+    from eth_keys.datatypes import Signature
+    from eulith_web3.signer import Signer
+
+SIGNER_CACHE_PATH = cache_path("signers.json")
+SIGNER_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+
+_memory_cache: Dict[Tuple[str, str], "LazyKmsSigner"] = {}
+_memory_cache_lock = threading.Lock()
+_disk_cache_lock = threading.Lock()
+
+
+def _cache_key(profile_name: str, key_id: str) -> str:
+    return f"{profile_name}|{key_id}"
+
+
+def _read_disk_cache() -> dict:
+    return read_json(SIGNER_CACHE_PATH, {})
+
+
+def _write_disk_cache(cache: dict):
+    write_json(SIGNER_CACHE_PATH, cache)
+
+
+def _load_cached_entry(profile_name: str, key_id: str, ttl: float) -> Optional[dict]:
+    entry = _read_disk_cache().get(_cache_key(profile_name, key_id))
+    if entry is None or time.time() - entry.get("cached_at", 0) > ttl:
+        return None
+    return entry
+
+
+def _store_entry(profile_name: str, key_id: str, public_key: str, address: str):
+    with _disk_cache_lock:
+        cache = _read_disk_cache()
+        cache[_cache_key(profile_name, key_id)] = {
+            "public_key": public_key,
+            "address": address,
+            "cached_at": time.time(),
+        }
+        _write_disk_cache(cache)
+
+
+def invalidate_signer_cache(profile_name: str = None, key_id: str = None):
+    """
+    Drop cached signers, both in memory and on disk. With no arguments everything is dropped,
+    otherwise only entries matching the given profile and/or key id.
+    """
+
+    def matches(profile, key):
+        return (profile_name is None or profile == profile_name) and (
+            key_id is None or key == key_id
+        )
+
+    with _memory_cache_lock:
+        for profile, key in [k for k in _memory_cache if matches(*k)]:
+            del _memory_cache[(profile, key)]
+
+    with _disk_cache_lock:
+        cache = _read_disk_cache()
+        remaining = {
+            k: v for k, v in cache.items() if not matches(*k.split("|", 1))
+        }
+        if remaining != cache:
+            _write_disk_cache(remaining)
+
+
+class LazyKmsSigner:
+    """
+    A KMS-backed signer whose address comes from the signer cache. The boto3 session and the
+    underlying KmsSigner are only created when something actually needs signing.
+
+    It implements eulith_web3's Signer interface without subclassing it, so that resolving
+    the address (show-wallet, the daemon's startup) doesn't import eth_account and web3.
+    """
+
+    def __init__(self, profile_name: str, key_id: str, ttl: float):
+        self.profile_name = profile_name
+        self.key_id = key_id
+        self.ttl = ttl
+        self._client = None
+        self._kms_signer = None
+        self._address = None
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        if self._client is None:
+            import boto3
+            from botocore.config import Config
+
+            session = boto3.Session(profile_name=self.profile_name)
+            # enough connections for a signing pool to keep every worker busy
+            self._client = session.client(
+                "kms", config=Config(max_pool_connections=SIGNING_WORKERS)
+            )
+        return self._client
+
+    @property
+    def address(self) -> str:
+        if self._address is None:
+            with self._lock:
+                if self._address is None:
+                    self._address = self._resolve_address()
+        return self._address
+
+    def _resolve_address(self) -> str:
+        entry = _load_cached_entry(self.profile_name, self.key_id, self.ttl)
+        if entry is not None:
+            return entry["address"]
+
+        from eth_keys.datatypes import PublicKey
+
+        with span("kms.get_public_key", self.key_id):
+            key = self._get_client().get_public_key(KeyId=self.key_id)
+        # DER encoded SubjectPublicKeyInfo, the last 64 bytes are the raw x || y coordinates
+        public_key = PublicKey(key["PublicKey"][-64:])
+        address = public_key.to_checksum_address()
+        _store_entry(self.profile_name, self.key_id, public_key.to_hex(), address)
+        return address
+
+    def _signer(self) -> "Signer":
+        if self._kms_signer is None:
+            with self._lock:
+                if self._kms_signer is None:
+                    from eulith_web3.kms import KmsSigner
+
+                    kms_signer = KmsSigner(self._get_client(), self.key_id)
+                    if self._address is not None and kms_signer.address != self._address:
+                        invalidate_signer_cache(self.profile_name, self.key_id)
+                        raise Exception(
+                            f"KMS key {self.key_id} now resolves to {kms_signer.address}, "
+                            f"not the cached address {self._address}. "
+                            "The signer cache has been cleared, please re-run."
+                        )
+                    self._address = kms_signer.address
+                    self._kms_signer = kms_signer
+        return self._kms_signer
+
+    def sign_msg_hash(self, message_hash: bytes) -> "Signature":
+        signer = self._signer()
+        with span("kms.sign", self.key_id):
+            return signer.sign_msg_hash(message_hash)
+
+    # like eulith_web3's Signer, transactions and typed data are signed by their hash
+
+    def sign_transaction(self, tx, message_hash: bytes) -> "Signature":
+        return self.sign_msg_hash(message_hash)
+
+    def sign_typed_data(self, eip712_data, message_hash: bytes) -> "Signature":
+        return self.sign_msg_hash(message_hash)
+
+
+def get_cached_kms_signer(
+    profile_name: str, key_id: str, ttl: float = SIGNER_CACHE_TTL_SECONDS
+) -> LazyKmsSigner:
+    with _memory_cache_lock:
+        signer = _memory_cache.get((profile_name, key_id))
+        if signer is None:
+            signer = _memory_cache[(profile_name, key_id)] = LazyKmsSigner(
+                profile_name, key_id, ttl
+            )
+        return signer
+
+
+def get_kms_signer(key_name: str = None, profile_name: str = None) -> LazyKmsSigner:
+    aws_credentials_profile_name = profile_name or AWS_CREDENTIALS_PROFILE_NAME
+    formatted_key_name = f"alias/{key_name or ETH_SIGNER_KEY_NAME}"
+
+    # the address comes from the signer cache, KMS is only contacted when signing
+    return get_cached_kms_signer(aws_credentials_profile_name, formatted_key_name)
@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, Iterable, List, NamedTuple
+
+from instrumentation import span
+
+if TYPE_CHECKING:
+    from eulith_web3.signer import Signature, Signer
+
+# concurrent KMS round trips per signer, also the size of the KMS client's connection pool
+SIGNING_WORKERS = int(os.environ.get("DYDX_TOOLS_SIGNING_WORKERS", "8"))
+
+# signer address -> SigningPool, for the life of the process
+_pools: Dict[str, "SigningPool"] = {}
+_pools_lock = threading.Lock()
+
+
+class SignResult(NamedTuple):
+    signature: "Signature"
+    # seconds from submit() until the signature came back, queueing included
+    latency: float
+
+
+class SigningPool:
+    """
+    Signs message hashes for one signer on a bounded pool of threads, so that many KMS round
+    trips are in flight at once instead of one after the other:
+
+        pool = get_signing_pool(signer)
+        signatures = [r.signature for r in pool.sign_many(message_hashes)]
+
+    Results always come back in submission order. Per-request latencies are kept for
+    stats(), and every signature is also timed as a "kms.sign" span by the signer itself.
+    """
+
+    def __init__(self, signer: "Signer", workers: int = SIGNING_WORKERS):
+        self.signer = signer
+        self.workers = max(1, workers)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="signing"
+        )
+        self._latencies: List[float] = []
+        self._lock = threading.Lock()
+
+    def _record(self, submitted_at: float) -> float:
+        latency = time.perf_counter() - submitted_at
+        with self._lock:
+            self._latencies.append(latency)
+        return latency
+
+    def _sign(self, message_hash: bytes, submitted_at: float) -> SignResult:
+        signature = self.signer.sign_msg_hash(message_hash)
+        return SignResult(signature, self._record(submitted_at))
+
+    def submit(self, message_hash: bytes) -> Future:
+        """
+        Queue a hash for signing, the future resolves to a SignResult.
+        """
+        return self._executor.submit(self._sign, message_hash, time.perf_counter())
+
+    def sign_many(self, message_hashes: Iterable[bytes]) -> List[SignResult]:
+        futures = [self.submit(h) for h in message_hashes]
+        return [f.result() for f in futures]
+
+    def sign_transactions(self, transactions: Iterable[dict]) -> List[Future]:
+        """
+        Sign fully populated transactions (nonce, gas and fees set) concurrently. The futures
+        resolve to raw transactions, in the order given, so they can be sent in nonce order
+        as they complete.
+        """
+        from eulith_web3.signing import sign_transaction
+
+        def sign(transaction: dict, submitted_at: float) -> bytes:
+            with span("signing.transaction", self.signer.address):
+                raw = sign_transaction(transaction, self.signer).rawTransaction
+            self._record(submitted_at)
+            return raw
+
+        return [
+            self._executor.submit(sign, tx, time.perf_counter()) for tx in transactions
+        ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies:
+            return {"count": 0}
+        return {
+            "count": len(latencies),
+            "p50_ms": 1000 * latencies[len(latencies) // 2],
+            "p95_ms": 1000
+            * latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            "max_ms": 1000 * latencies[-1],
+        }
+
+    def print_stats(self):
+        stats = self.stats()
+        if not stats["count"]:
+            return
+        print(
+            f"Signed {stats['count']} messages with {self.workers} workers: "
+            f"p50 {stats['p50_ms']:.1f}ms, p95 {stats['p95_ms']:.1f}ms, "
+            f"max {stats['max_ms']:.1f}ms"
+        )
+
+
+def get_signing_pool(signer: "Signer") -> SigningPool:
+    """
+    The process-wide pool for a signer, created on first use.
+    """
+    with _pools_lock:
+        pool = _pools.get(signer.address)
+        if pool is None:
+            pool = _pools[signer.address] = SigningPool(signer)
+        return pool
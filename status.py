@@ -0,0 +1,124 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from dydx3.constants import *
+from eulith_web3.signer import Signer
+
+from account_config import AccountConfig, default_account_config
+from account_snapshot import get_account_snapshots
+from abi_registry import get_contract
+from accounts import stark_public_key_pair
+from multicall import get_multicall, multicall
+from utils import get_exchange_contract, get_exchange_contract_address, get_kms_signer
+from web3_provider import open_web3
+
+WETH_CONTRACTS = {
+    NETWORK_ID_MAINNET: "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2",
+}
+ETH_DECIMALS = 18
+
+
+def _amount(value: Optional[int], decimals: int) -> Optional[str]:
+    # None when the call failed, so one bad read doesn't hide the rest
+    if value is None:
+        return None
+    return str(value / 10**decimals)
+
+
+def _read_chain_state(network_id: int, account: AccountConfig, signer: Signer) -> dict:
+    address = signer.address
+    public_x, _ = stark_public_key_pair(account.stark_private_key)
+
+    with open_web3(signer) as ew3:
+        usdc = get_contract(
+            ew3,
+            "erc20",
+            ew3.to_checksum_address(TOKEN_CONTRACTS[COLLATERAL_ASSET][network_id]),
+        )
+        weth = get_contract(
+            ew3, "erc20", ew3.to_checksum_address(WETH_CONTRACTS[network_id])
+        )
+        exchange = get_exchange_contract(network_id, ew3)
+
+        # a single eth_call through Multicall3
+        eth, weth_balance, usdc_balance, allowance, withdrawable = multicall(
+            ew3,
+            [
+                get_multicall(ew3).functions.getEthBalance(address),
+                weth.functions.balanceOf(address),
+                usdc.functions.balanceOf(address),
+                usdc.functions.allowance(
+                    address, get_exchange_contract_address(network_id)
+                ),
+                exchange.functions.getWithdrawalBalance(
+                    int(public_x, 16), COLLATERAL_ASSET_ID_BY_NETWORK_ID[network_id]
+                ),
+            ],
+            allow_failure=True,
+        )
+
+    return {
+        "ETH": _amount(eth, ETH_DECIMALS),
+        "WETH": _amount(weth_balance, ETH_DECIMALS),
+        "USDC": _amount(usdc_balance, COLLATERAL_TOKEN_DECIMALS),
+        "USDCAllowance": _amount(allowance, COLLATERAL_TOKEN_DECIMALS),
+        "withdrawable": _amount(withdrawable, COLLATERAL_TOKEN_DECIMALS),
+    }
+
+
+def _get_status_internal(network_id: int, account: AccountConfig = None) -> dict:
+    """
+    Wallet balances, the exchange allowance and the on-chain withdrawable balance (one
+    multicall), next to the dydx account, which is fetched concurrently.
+    """
+    # open_web3 only talks to the mainnet RPC
+    if network_id != 1:
+        raise Exception(
+            "unsupported network_id, can only perform this operation on mainnet"
+        )
+
+    account = account or default_account_config()
+    signer = get_kms_signer(
+        account.eth_signer_key_name, account.aws_credentials_profile_name
+    )
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        dydx_account = executor.submit(
+            get_account_snapshots().primary, network_id, account
+        )
+        wallet = _read_chain_state(network_id, account, signer)
+        snapshot = dydx_account.result()
+
+    return {
+        "address": signer.address,
+        "wallet": wallet,
+        "dydx": {
+            "equity": snapshot.equity,
+            "freeCollateral": snapshot.free_collateral,
+            "pendingDeposits": snapshot.pending_deposits,
+            "pendingWithdrawals": snapshot.pending_withdrawals,
+            "openPositions": len(snapshot.open_positions),
+        },
+    }
+
+
+def show_status(args):
+    status = _get_status_internal(int(args.network_id))
+    if args.json:
+        print(json.dumps(status))
+        return
+
+    wallet, dydx = status["wallet"], status["dydx"]
+    print(f"wallet address: {status['address']}")
+    print(f"  ETH:  {wallet['ETH']}")
+    print(f"  WETH: {wallet['WETH']}")
+    print(f"  USDC: {wallet['USDC']} (allowance to dydx: {wallet['USDCAllowance']})")
+    print(f"  withdrawable from the exchange contract: {wallet['withdrawable']} USDC")
+    print("dydx account:")
+    print(f"  equity: {dydx['equity']}, free collateral: {dydx['freeCollateral']}")
+    print(
+        f"  pending deposits: {dydx['pendingDeposits']}, "
+        f"pending withdrawals: {dydx['pendingWithdrawals']}"
+    )
+    print(f"  open positions: {dydx['openPositions']}")
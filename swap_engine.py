@@ -0,0 +1,202 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from eulith_web3.erc20 import EulithERC20
+from eulith_web3.swap import EulithSwapRequest
+
+from fees import suggest_fees
+from instrumentation import span
+
+# quotes are only reused briefly, prices and routes go stale within a block or two
+QUOTE_TTL_SECONDS = float(os.environ.get("DYDX_TOOLS_QUOTE_TTL", "10"))
+# rough gas of one chunk's swap transactions, used to weigh splitting against its gas
+SWAP_GAS_ESTIMATE = 250000
+# chunk counts compared when no maximum is given
+DEFAULT_MAX_CHUNKS = 8
+
+
+class Quote(NamedTuple):
+    sell_amount: float
+    # sell token per unit of the buy token, as returned by get_swap_quote
+    price: float
+    txs: Tuple[dict, ...]
+    fetched_at: float
+
+    @property
+    def buy_amount(self) -> float:
+        return self.sell_amount / self.price
+
+
+def fetch_quote(
+    ew3, sell_token: EulithERC20, buy_token: EulithERC20, sell_amount: float
+) -> Quote:
+    with span("eulith.swap_quote"):
+        price, txs = ew3.v0.get_swap_quote(
+            EulithSwapRequest(
+                sell_token=sell_token, buy_token=buy_token, sell_amount=sell_amount
+            )
+        )
+    return Quote(sell_amount, price, tuple(txs), time.monotonic())
+
+
+class QuoteCache:
+    """
+    Swap quotes per (sell token, buy token, sell amount), reused for `ttl` seconds. Only
+    for comparing prices: a cached quote's transactions are built against the state it was
+    fetched in, so anything executed is quoted again with fetch_quote().
+    """
+
+    def __init__(self, ttl: float = QUOTE_TTL_SECONDS):
+        self.ttl = ttl
+        self._quotes: Dict[Tuple[str, str, float], Quote] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self, ew3, sell_token: EulithERC20, buy_token: EulithERC20, sell_amount: float
+    ) -> Quote:
+        key = (sell_token.address, buy_token.address, sell_amount)
+        with self._lock:
+            quote = self._quotes.get(key)
+        if quote is not None and time.monotonic() - quote.fetched_at <= self.ttl:
+            return quote
+
+        quote = fetch_quote(ew3, sell_token, buy_token, sell_amount)
+        with self._lock:
+            # every amount compared gets its own key, so drop what has expired
+            expired = [
+                k
+                for k, q in self._quotes.items()
+                if quote.fetched_at - q.fetched_at > self.ttl
+            ]
+            for k in expired:
+                del self._quotes[k]
+            self._quotes[key] = quote
+        return quote
+
+
+_quote_cache = QuoteCache()
+
+
+def get_quote_cache() -> QuoteCache:
+    return _quote_cache
+
+
+class SplitOption(NamedTuple):
+    chunks: int
+    quote: Quote
+    # total buy amount expected from all chunks, at this chunk size's price
+    buy_amount: float
+    # how much worse than the smallest chunk size's price, in basis points
+    slippage_bps: float
+    # gas of every chunk's swap, in the buy token
+    gas_cost: float
+
+    @property
+    def net_buy_amount(self) -> float:
+        return self.buy_amount - self.gas_cost
+
+
+def chunk_counts(max_chunks: int) -> List[int]:
+    """
+    1, 2, 4... up to and including max_chunks.
+    """
+    counts = []
+    n = 1
+    while n < max_chunks:
+        counts.append(n)
+        n *= 2
+    return counts + [max(max_chunks, 1)]
+
+
+def compare_splits(
+    ew3,
+    sell_token: EulithERC20,
+    buy_token: EulithERC20,
+    amount: float,
+    counts: List[int],
+    quotes: QuoteCache = None,
+) -> List[SplitOption]:
+    """
+    Quote one chunk for every chunk count concurrently, and estimate what each split would
+    buy. Later chunks trade against the price the earlier ones moved, which the per-chunk
+    quotes can't see; spacing them out (see execute_split) lets the market recover.
+    """
+    quotes = quotes or get_quote_cache()
+    with ThreadPoolExecutor(max_workers=len(counts)) as executor:
+        futures = [
+            executor.submit(quotes.get, ew3, sell_token, buy_token, amount / n)
+            for n in counts
+        ]
+        chunk_quotes = [f.result() for f in futures]
+
+    best_price = min(q.price for q in chunk_quotes)
+    # gas is paid in ETH, valued at the best quoted rate, so this assumes (W)ETH is sold
+    gas_per_chunk = SWAP_GAS_ESTIMATE * suggest_fees(ew3)["maxFeePerGas"] / 10**18
+    options = []
+    for n, quote in zip(counts, chunk_quotes):
+        options.append(
+            SplitOption(
+                n,
+                quote,
+                n * quote.buy_amount,
+                10000 * (quote.price / best_price - 1),
+                n * gas_per_chunk / best_price,
+            )
+        )
+    return options
+
+
+def best_split(options: List[SplitOption]) -> SplitOption:
+    return max(options, key=lambda o: (o.net_buy_amount, -o.chunks))
+
+
+def print_splits(options: List[SplitOption], chosen: Optional[SplitOption] = None):
+    print(
+        f"{'chunks':>6} {'chunk size':>12} {'price':>12} {'expected':>14} "
+        f"{'slippage':>9} {'gas':>10}"
+    )
+    for o in options:
+        marker = " <-" if o is chosen else ""
+        print(
+            f"{o.chunks:>6} {o.quote.sell_amount:>12.6f} {1 / o.quote.price:>12.4f} "
+            f"{o.buy_amount:>14.4f} {o.slippage_bps:>7.1f}bp {o.gas_cost:>10.4f}{marker}"
+        )
+
+
+def execute_split(
+    ew3,
+    pipeline,
+    signer,
+    sell_token: EulithERC20,
+    buy_token: EulithERC20,
+    amount: float,
+    chunks: int,
+    interval: float = 0,
+) -> List[Quote]:
+    """
+    Sell `amount` in `chunks` equal swaps. Each chunk is quoted just before it is sent, its
+    transactions are signed together and pipelined behind whatever is already pending, then
+    mined before the next chunk is quoted, `interval` seconds later (a TWAP when the
+    interval is long enough for prices to recover).
+    """
+    executed = []
+    for i in range(chunks):
+        if i and interval:
+            time.sleep(interval)
+        quote = fetch_quote(ew3, sell_token, buy_token, amount / chunks)
+        pipeline.submit_many(
+            list(quote.txs),
+            signer,
+            [f"swap-{i}-{j}" for j in range(len(quote.txs))],
+        )
+        print(
+            f"Swap {i + 1}/{chunks}: {quote.sell_amount} at {1 / quote.price:.4f}, "
+            f"expecting {quote.buy_amount:.4f}"
+        )
+        # the next chunk must be quoted against the state this one leaves behind
+        pipeline.wait_all()
+        executed.append(quote)
+    return executed
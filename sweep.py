@@ -0,0 +1,280 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Tuple
+
+from dydx3.constants import *
+from dydx3.helpers.request_helpers import generate_query_path
+from eulith_web3.signer import Signer
+from web3 import Web3
+
+from account_config import (
+    AccountConfig,
+    default_account_config,
+    load_accounts_manifest,
+)
+from accounts import stark_public_key_pair
+from fees import contract_transaction
+from http_session import request
+from multicall import multicall
+from tx_pipeline import TxPipeline
+from utils import get_dydx_host, get_exchange_contract, get_kms_signer
+from web3_provider import close_warm_web3, keep_web3_warm, open_web3
+
+# every sleep is the interval +/- up to this fraction, so many sweepers don't line up
+SWEEP_JITTER = 0.2
+ETH_DECIMALS = 18
+
+
+class Withdrawable(NamedTuple):
+    account: AccountConfig
+    owner_key: int
+    # in USDC base units
+    quantums: int
+
+
+def _owner_key(account: AccountConfig) -> int:
+    public_x, _ = stark_public_key_pair(account.stark_private_key)
+    return int(public_x, 16)
+
+
+def _signer_for(account: AccountConfig) -> Signer:
+    return get_kms_signer(
+        account.eth_signer_key_name, account.aws_credentials_profile_name
+    )
+
+
+def withdrawable_balances(
+    web3: Web3, network_id: int, accounts: List[AccountConfig]
+) -> List[Withdrawable]:
+    """
+    The USDC waiting on the exchange contract for every account's stark key, read in a
+    single eth_call.
+    """
+    contract = get_exchange_contract(network_id, web3)
+    asset_id = COLLATERAL_ASSET_ID_BY_NETWORK_ID[network_id]
+    owner_keys = [_owner_key(a) for a in accounts]
+    balances = multicall(
+        web3,
+        [contract.functions.getWithdrawalBalance(key, asset_id) for key in owner_keys],
+    )
+    return [
+        Withdrawable(account, key, balance)
+        for account, key, balance in zip(accounts, owner_keys, balances)
+    ]
+
+
+def eth_usd_price(network_id: int) -> float:
+    endpoint = generate_query_path("/v3/markets", {"market": "ETH-USD"})
+    response = request(get_dydx_host(network_id) + endpoint, "get").data
+    return float(response["markets"]["ETH-USD"]["oraclePrice"])
+
+
+def _claim(w: Withdrawable) -> dict:
+    return {
+        "account": w.account.name,
+        "amount": w.quantums / 10**COLLATERAL_TOKEN_DECIMALS,
+        "gasCost": None,
+    }
+
+
+def _submit_claims(
+    ew3, signer: Signer, txs: List[dict], claims: List[dict]
+) -> List[dict]:
+    """
+    Send the claims' withdrawals and wait for them. A failure part way still reports the
+    ones that were broadcast before it, with their hashes.
+    """
+    with TxPipeline(ew3, signer.address) as pipeline:
+        error = None
+        try:
+            pipeline.submit_many(
+                txs, signer, [f"withdraw-{c['account']}" for c in claims]
+            )
+        except Exception as e:
+            error = e
+
+        # submitted in order, so whatever made it out is a prefix of the claims
+        results = []
+        for i, claim in enumerate(claims):
+            if i >= len(pipeline.pending):
+                results.append({**claim, "action": "failed", "error": repr(error)})
+                continue
+            p = pipeline.pending[i]
+            try:
+                receipt = pipeline.wait(p)
+            except Exception as e:
+                results.append(
+                    {**claim, "action": "failed", "txHash": p.tx_hash, "error": repr(e)}
+                )
+                continue
+            results.append(
+                {
+                    **claim,
+                    "action": "withdrew",
+                    "txHash": p.tx_hash,
+                    "block": receipt["blockNumber"],
+                }
+            )
+        return results
+
+
+def _sweep_signer(
+    network_id: int,
+    due: List[Withdrawable],
+    eth_price: float,
+    gas_cost_multiple: float,
+    min_amount: float,
+    dry_run: bool,
+) -> List[dict]:
+    signer = _signer_for(due[0].account)
+    results = []
+    with open_web3(signer) as ew3:
+        contract = get_exchange_contract(network_id, ew3)
+        asset_id = COLLATERAL_ASSET_ID_BY_NETWORK_ID[network_id]
+
+        txs, submitting = [], []
+        for w in due:
+            result = _claim(w)
+            try:
+                tx = contract_transaction(
+                    ew3,
+                    contract.functions.withdraw(w.owner_key, asset_id),
+                    signer.address,
+                )
+            except Exception as e:
+                # e.g. the estimate reverted, the signer's other claims can still go
+                results.append({**result, "action": "failed", "error": repr(e)})
+                continue
+
+            # priced at the max fee, so the real cost is lower
+            gas_cost = tx["gas"] * tx["maxFeePerGas"] / 10**ETH_DECIMALS * eth_price
+            result["gasCost"] = gas_cost
+            amount = result["amount"]
+            if amount < min_amount or amount < gas_cost_multiple * gas_cost:
+                results.append({**result, "action": "skipped"})
+            elif dry_run:
+                results.append({**result, "action": "would withdraw"})
+            else:
+                txs.append(tx)
+                submitting.append(result)
+
+        if txs:
+            # waits, so the next sweep doesn't see these balances again
+            results += _submit_claims(ew3, signer, txs, submitting)
+    return results
+
+
+def sweep_once(
+    network_id: int,
+    accounts: List[AccountConfig],
+    gas_cost_multiple: float,
+    min_amount: float = 0,
+    dry_run: bool = False,
+) -> List[dict]:
+    """
+    Check every account's withdrawable balance and claim the ones worth their gas (claims
+    of at least `gas_cost_multiple` times their gas cost). Claims are batched per ETH key,
+    since each stark key's withdrawal must come from its own owner, and different keys are
+    swept concurrently; a key that fails is reported without holding up the others.
+    """
+    with open_web3(_signer_for(accounts[0])) as ew3:
+        balances = withdrawable_balances(ew3, network_id, accounts)
+
+    # accounts sharing a stark key share its balance, claim it once
+    due, seen = [], set()
+    for w in balances:
+        if w.quantums > 0 and w.owner_key not in seen:
+            seen.add(w.owner_key)
+            due.append(w)
+    if not due:
+        return []
+
+    by_signer: Dict[Tuple[str, str], List[Withdrawable]] = {}
+    for w in due:
+        key = (w.account.aws_credentials_profile_name, w.account.eth_signer_key_name)
+        by_signer.setdefault(key, []).append(w)
+
+    eth_price = eth_usd_price(network_id)
+    with ThreadPoolExecutor(max_workers=len(by_signer)) as executor:
+        futures = [
+            (
+                group,
+                executor.submit(
+                    _sweep_signer,
+                    network_id,
+                    group,
+                    eth_price,
+                    gas_cost_multiple,
+                    min_amount,
+                    dry_run,
+                ),
+            )
+            for group in by_signer.values()
+        ]
+        results = []
+        for group, future in futures:
+            try:
+                results += future.result()
+            except Exception as e:
+                results += [
+                    {**_claim(w), "action": "failed", "error": repr(e)} for w in group
+                ]
+        return results
+
+
+def _print_sweep(results: List[dict]):
+    if not results:
+        print("Nothing to withdraw")
+    for r in results:
+        line = f"{r['account']}: {r['action']} {r['amount']} USDC"
+        if r["gasCost"] is not None:
+            line += f" (gas cost up to ${r['gasCost']:.2f})"
+        if "block" in r:
+            line += f", tx {r['txHash']} mined in block {r['block']}"
+        elif "txHash" in r:
+            line += f", tx {r['txHash']}"
+        if "error" in r:
+            line += f": {r['error']}"
+        print(line, flush=True)
+
+
+def jittered(interval: float, jitter: float = SWEEP_JITTER) -> float:
+    return interval * random.uniform(1 - jitter, 1 + jitter)
+
+
+def sweep_withdraws(args):
+    network_id = int(args.network_id)
+    if args.accounts:
+        accounts = load_accounts_manifest(args.accounts)
+    else:
+        accounts = [default_account_config()]
+
+    # one connection per signer for every round, instead of reconnecting each time
+    owns_connections = keep_web3_warm()
+    try:
+        while True:
+            try:
+                _print_sweep(
+                    sweep_once(
+                        network_id,
+                        accounts,
+                        args.gas_cost_multiple,
+                        args.min_amount,
+                        args.dry_run,
+                    )
+                )
+            except Exception as e:
+                if args.once:
+                    raise
+                # a failed sweep is retried on the next round
+                print(f"Sweep failed: {e!r}", flush=True)
+
+            if args.once:
+                return
+            time.sleep(jittered(args.interval))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if owns_connections:
+            close_warm_web3()
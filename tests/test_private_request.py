@@ -0,0 +1,76 @@
+"""
+RequestSigner against dydx3's own header derivation (Private.sign), on fixed inputs.
+"""
+import base64
+
+import pytest
+from dydx3.helpers.request_helpers import remove_nones
+from dydx3.modules.private import Private
+
+from private_request import ApiCredentials, RequestSigner, encode_body
+
+CREDENTIALS = ApiCredentials(
+    "00000000-0000-0000-0000-000000000000",
+    base64.urlsafe_b64encode(b"regression-test-secret-32-bytes!").decode(),
+    "passphrase",
+)
+TIMESTAMP = "2023-01-02T03:04:05.678Z"
+
+BODIES = [
+    pytest.param(None, id="no body"),
+    pytest.param({}, id="empty object"),
+    pytest.param({"clientId": None}, id="only nones"),
+    pytest.param(
+        {
+            "amount": "10.5",
+            "asset": "USDC",
+            "expiration": "2023-01-09T03:04:05.678Z",
+            "clientId": "123",
+            "signature": None,
+        },
+        id="compact json",
+    ),
+]
+
+
+def dydx3_signature(request_path: str, method: str, timestamp: str, data) -> str:
+    private = Private(
+        host="https://api.dydx.exchange",
+        network_id=1,
+        stark_private_key=None,
+        default_address=None,
+        api_timeout=None,
+        api_key_credentials={
+            "key": CREDENTIALS.api_key,
+            "secret": CREDENTIALS.api_secret,
+            "passphrase": CREDENTIALS.api_passphrase,
+        },
+    )
+    # what Private._private_request signs
+    return private.sign(
+        request_path=request_path,
+        method=method,
+        iso_timestamp=timestamp,
+        data=remove_nones(data) if data is not None else None,
+    )
+
+
+@pytest.mark.parametrize("data", BODIES)
+@pytest.mark.parametrize("method", ["GET", "POST", "DELETE"])
+def test_signature_matches_dydx3(method, data):
+    signature = RequestSigner(CREDENTIALS).sign(
+        "/v3/withdrawals", method, TIMESTAMP, encode_body(data)
+    )
+    assert signature == dydx3_signature("/v3/withdrawals", method, TIMESTAMP, data)
+
+
+@pytest.mark.parametrize("data", BODIES)
+def test_headers_match_dydx3(data):
+    headers = RequestSigner(CREDENTIALS).headers(
+        "/v3/withdrawals", "post", encode_body(data)
+    )
+    assert headers["DYDX-API-KEY"] == CREDENTIALS.api_key
+    assert headers["DYDX-PASSPHRASE"] == CREDENTIALS.api_passphrase
+    assert headers["DYDX-SIGNATURE"] == dydx3_signature(
+        "/v3/withdrawals", "POST", headers["DYDX-TIMESTAMP"], data
+    )
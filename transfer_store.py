@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import List, Optional
+
+from account_config import AccountConfig, default_account_config
+from cache import cache_path
+from funding import _get_transfers_internal
+
+TRANSFER_STORE_PATH = cache_path("transfers.sqlite")
+SYNC_PAGE_SIZE = 100
+
+# transfers in these states can still change, so syncs re-read from the oldest of them
+NON_FINAL_STATUSES = ("PENDING", "QUEUED")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transfers (
+    account_key TEXT NOT NULL,
+    id TEXT NOT NULL,
+    type TEXT,
+    status TEXT,
+    transaction_hash TEXT,
+    created_at TEXT NOT NULL,
+    raw TEXT NOT NULL,
+    PRIMARY KEY (account_key, id)
+);
+CREATE INDEX IF NOT EXISTS transfers_type ON transfers (account_key, type, created_at);
+CREATE INDEX IF NOT EXISTS transfers_status ON transfers (account_key, status, created_at);
+CREATE INDEX IF NOT EXISTS transfers_created_at ON transfers (account_key, created_at);
+CREATE INDEX IF NOT EXISTS transfers_tx_hash ON transfers (transaction_hash);
+"""
+
+
+class TransferStore:
+    """
+    Local, indexed copy of an account's /v3/transfers history. sync() only downloads pages
+    newer than what is already stored (plus anything still pending), so repeated reads are
+    served from SQLite.
+    """
+
+    def __init__(self, path: str = TRANSFER_STORE_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    @staticmethod
+    def account_key(network_id: int, account: AccountConfig) -> str:
+        # the API key is a credential, only a digest of it is written to disk
+        digest = hashlib.sha256(account.api_key.encode("utf-8")).hexdigest()
+        return f"{network_id}/{digest}"
+
+    def _sync_floor(self, key: str) -> Optional[str]:
+        """
+        Everything created after this timestamp needs re-reading; None means a full sync.
+        """
+        placeholders = ",".join("?" for _ in NON_FINAL_STATUSES)
+        row = self._conn.execute(
+            f"""
+            SELECT
+                (SELECT MAX(created_at) FROM transfers WHERE account_key = ?) AS newest,
+                (SELECT MIN(created_at) FROM transfers
+                 WHERE account_key = ? AND status IN ({placeholders})) AS oldest_open
+            """,
+            (key, key, *NON_FINAL_STATUSES),
+        ).fetchone()
+        if row["oldest_open"] is not None:
+            return min(row["newest"], row["oldest_open"])
+        return row["newest"]
+
+    def _upsert(self, key: str, transfers: List[dict]):
+        self._conn.executemany(
+            """
+            INSERT OR REPLACE INTO transfers
+                (account_key, id, type, status, transaction_hash, created_at, raw)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (
+                    key,
+                    t["id"],
+                    t.get("type"),
+                    t.get("status"),
+                    (t.get("transactionHash") or "").lower() or None,
+                    t["createdAt"],
+                    json.dumps(t),
+                )
+                for t in transfers
+            ],
+        )
+
+    def sync(self, network_id: int, account: AccountConfig = None) -> int:
+        """
+        Fetch transfers newer than the last sync, newest first, and store them. Returns the
+        number of transfers downloaded.
+        """
+        account = account or default_account_config()
+        key = self.account_key(network_id, account)
+
+        with self._lock:
+            floor = self._sync_floor(key)
+            cursor = None
+            downloaded = 0
+
+            while True:
+                page = _get_transfers_internal(
+                    network_id,
+                    account,
+                    limit=SYNC_PAGE_SIZE,
+                    created_before_or_at=cursor,
+                )
+                if not page:
+                    break
+
+                with self._conn:
+                    self._upsert(key, page)
+                downloaded += len(page)
+
+                oldest = min(t["createdAt"] for t in page)
+                if len(page) < SYNC_PAGE_SIZE or (floor is not None and oldest <= floor):
+                    break
+                if oldest == cursor:
+                    break  # a full page sharing one timestamp, nothing older is reachable
+                cursor = oldest
+
+            return downloaded
+
+    def query(
+        self,
+        network_id: int,
+        account: AccountConfig = None,
+        since: str = None,
+        status: str = None,
+        transfer_type: str = None,
+        transaction_hash: str = None,
+    ) -> List[dict]:
+        account = account or default_account_config()
+        clauses = ["account_key = ?"]
+        params = [self.account_key(network_id, account)]
+
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status.upper())
+        if transfer_type is not None:
+            clauses.append("type = ?")
+            params.append(transfer_type.upper())
+        if transaction_hash is not None:
+            clauses.append("transaction_hash = ?")
+            params.append(transaction_hash.lower())
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT raw FROM transfers WHERE {' AND '.join(clauses)} "
+                "ORDER BY created_at DESC",
+                params,
+            ).fetchall()
+        return [json.loads(row["raw"]) for row in rows]
@@ -0,0 +1,302 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from dydx3.errors import TransactionReverted
+from eulith_web3.signer import Signer
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+
+from signing_pool import get_signing_pool
+
+# (RPC endpoint, address) -> NonceManager, shared by every pipeline sending from that
+# address in this process, whichever web3 instance it uses
+_nonce_managers: Dict[Tuple[str, str], "NonceManager"] = {}
+_nonce_managers_lock = threading.Lock()
+
+# replacement transactions must raise fees by at least 10% to be accepted by geth
+REPLACEMENT_FEE_BUMP = 1.125
+# a local nonce unused for this long is checked against the node again, in case another
+# process sent from the same address in the meantime
+NONCE_RESYNC_SECONDS = 5
+# receipts tracked at once per pipeline, later transactions wait for a free worker
+RECEIPT_WORKERS = 4
+
+
+class NonceManager:
+    """
+    Hands out nonces for one address locally, so several transactions can be submitted
+    back-to-back without waiting for each to land in the node's pending pool.
+    """
+
+    def __init__(self, key: Tuple[str, str]):
+        self.key = key
+        self.address = key[1]
+        # pipelines holding this manager, see acquire_nonce_manager()
+        self.users = 0
+        self._next_nonce = None
+        self._allocated_at = 0.0
+        self._lock = threading.Lock()
+
+    def next_nonce(self, web3: Web3) -> int:
+        with self._lock:
+            now = time.monotonic()
+            if (
+                self._next_nonce is None
+                or now - self._allocated_at > NONCE_RESYNC_SECONDS
+            ):
+                pending = web3.eth.get_transaction_count(self.address, "pending")
+                # ours may not have reached the node's pool yet, never reuse a nonce
+                self._next_nonce = max(pending, self._next_nonce or 0)
+            nonce = self._next_nonce
+            self._next_nonce += 1
+            self._allocated_at = now
+            return nonce
+
+    def reset(self):
+        """
+        Forget the local nonce, the next allocation re-reads it from the node.
+        """
+        with self._lock:
+            self._next_nonce = None
+
+
+def _rpc_endpoint(web3: Web3) -> str:
+    provider = web3.provider
+    return str(getattr(provider, "endpoint_uri", None) or id(provider))
+
+
+def acquire_nonce_manager(web3: Web3, address: str) -> NonceManager:
+    """
+    The process-wide nonce manager for `address` on web3's node. Pair every call with
+    release_nonce_manager(); the manager is dropped once no one holds it.
+    """
+    key = (_rpc_endpoint(web3), address.lower())
+    with _nonce_managers_lock:
+        manager = _nonce_managers.get(key)
+        if manager is None:
+            manager = _nonce_managers[key] = NonceManager(key)
+        manager.users += 1
+        return manager
+
+
+def release_nonce_manager(manager: NonceManager):
+    with _nonce_managers_lock:
+        manager.users -= 1
+        if manager.users <= 0 and _nonce_managers.get(manager.key) is manager:
+            del _nonce_managers[manager.key]
+
+
+class PendingTransaction:
+    def __init__(self, label: str, nonce: int, tx_params: dict, tx_hash: str):
+        self.label = label
+        self.nonce = nonce
+        self.tx_params = tx_params
+        # every hash broadcast for this nonce, the original first
+        self.tx_hashes = [tx_hash]
+        self.submitted_at = time.monotonic()
+        self.receipt: Optional[Future] = None
+
+    @property
+    def tx_hash(self) -> str:
+        return self.tx_hashes[-1]
+
+
+def _bump_fees(web3: Web3, tx_params: dict) -> dict:
+    bumped = dict(tx_params)
+    if "maxFeePerGas" in bumped:
+        bumped["maxFeePerGas"] = int(bumped["maxFeePerGas"] * REPLACEMENT_FEE_BUMP)
+        bumped["maxPriorityFeePerGas"] = int(
+            bumped.get("maxPriorityFeePerGas", 0) * REPLACEMENT_FEE_BUMP
+        )
+    else:
+        current = web3.eth.gas_price
+        previous = bumped.get("gasPrice", current)
+        bumped["gasPrice"] = max(int(previous * REPLACEMENT_FEE_BUMP), current)
+    return bumped
+
+
+class TxPipeline:
+    """
+    Submits transactions from one address with locally allocated nonces, without waiting for
+    earlier ones to be mined, and tracks their receipts concurrently. Transactions that sit
+    unmined for `stuck_after` seconds are re-broadcast with bumped fees, up to `max_bumps`
+    times.
+
+        with TxPipeline(ew3, signer.address) as pipeline:
+            pipeline.submit(approve_tx, "approve")
+            pipeline.submit(deposit_tx, "deposit")
+            receipts = pipeline.wait_all()
+
+    Closing the pipeline stops tracking whatever is still unmined.
+    """
+
+    def __init__(
+        self,
+        web3: Web3,
+        address: str,
+        receipt_timeout: float = 600,
+        stuck_after: float = 120,
+        max_bumps: int = 3,
+        poll_interval: float = 2,
+    ):
+        self.web3 = web3
+        self.address = address
+        self.nonces = acquire_nonce_manager(web3, address)
+        self.receipt_timeout = receipt_timeout
+        self.stuck_after = stuck_after
+        self.max_bumps = max_bumps
+        self.poll_interval = poll_interval
+        self.pending: List[PendingTransaction] = []
+        self._executor = ThreadPoolExecutor(
+            max_workers=RECEIPT_WORKERS, thread_name_prefix="tx-receipts"
+        )
+        self._closed = threading.Event()
+        self._lock = threading.Lock()
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        release_nonce_manager(self.nonces)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, tx_params: dict, label: str = "") -> PendingTransaction:
+        if "gas" not in tx_params:
+            # gas gets estimated against the latest state, which must include what's before
+            self.wait_all()
+
+        tx_params = dict(tx_params)
+        tx_params.setdefault("from", self.address)
+        tx_params["nonce"] = self.nonces.next_nonce(self.web3)
+
+        try:
+            tx_hash = self.web3.eth.send_transaction(tx_params).hex()
+        except Exception:
+            # the nonce may or may not have been consumed, let the node tell us next time
+            self.nonces.reset()
+            raise
+
+        pending = PendingTransaction(label, tx_params["nonce"], tx_params, tx_hash)
+        pending.receipt = self._executor.submit(self._track, pending)
+        with self._lock:
+            self.pending.append(pending)
+        return pending
+
+    def submit_many(
+        self, txs: List[dict], signer: Signer, labels: List[str] = None
+    ) -> List[PendingTransaction]:
+        """
+        Throughput mode for `signer`, which must own this pipeline's address: nonces are
+        allocated up front, every transaction is signed concurrently on the signer's
+        SigningPool, and the raw transactions are broadcast in nonce order as their
+        signatures come back.
+
+        Gas can only be estimated for the first transaction (after waiting for what's
+        already pending); if a later one has no "gas" they are submitted one by one.
+        """
+        labels = labels or [""] * len(txs)
+        if not txs:
+            return []
+        if any("gas" not in tx for tx in txs[1:]):
+            return [self.submit(tx, label) for tx, label in zip(txs, labels)]
+        if "gas" not in txs[0]:
+            self.wait_all()
+
+        from eulith_web3.signing import format_transaction
+        from web3._utils.transactions import fill_transaction_defaults
+
+        populated = []
+        for tx in txs:
+            tx = dict(tx)
+            tx.setdefault("from", self.address)
+            tx["nonce"] = self.nonces.next_nonce(self.web3)
+            populated.append(fill_transaction_defaults(self.web3, tx))
+
+        raw_txs = get_signing_pool(signer).sign_transactions(
+            [format_transaction(tx) for tx in populated]
+        )
+        submitted = []
+        try:
+            for tx, raw_tx, label in zip(populated, raw_txs, labels):
+                tx_hash = self.web3.eth.send_raw_transaction(raw_tx.result()).hex()
+                pending = PendingTransaction(label, tx["nonce"], tx, tx_hash)
+                pending.receipt = self._executor.submit(self._track, pending)
+                with self._lock:
+                    self.pending.append(pending)
+                submitted.append(pending)
+        except Exception:
+            # the rest of the nonces were never used, let the node tell us next time
+            for raw_tx in raw_txs:
+                raw_tx.cancel()
+            self.nonces.reset()
+            raise
+        return submitted
+
+    def speed_up(self, pending: PendingTransaction) -> str:
+        """
+        Re-broadcast a pending transaction with the same nonce and higher fees.
+        """
+        with self._lock:
+            pending.tx_params = _bump_fees(self.web3, pending.tx_params)
+            tx_hash = self.web3.eth.send_transaction(pending.tx_params).hex()
+            pending.tx_hashes.append(tx_hash)
+            pending.submitted_at = time.monotonic()
+        return tx_hash
+
+    def _find_receipt(self, pending: PendingTransaction):
+        for tx_hash in reversed(pending.tx_hashes):
+            try:
+                return self.web3.eth.get_transaction_receipt(tx_hash)
+            except TransactionNotFound:
+                continue
+        return None
+
+    def _track(self, pending: PendingTransaction):
+        deadline = time.monotonic() + self.receipt_timeout
+        while True:
+            receipt = self._find_receipt(pending)
+            if receipt is not None:
+                if receipt["status"] != 1:
+                    raise TransactionReverted(receipt)
+                return receipt
+
+            if time.monotonic() > deadline:
+                raise Exception(
+                    f"transaction {pending.label or pending.tx_hash} (nonce "
+                    f"{pending.nonce}) not mined after {self.receipt_timeout} seconds"
+                )
+
+            stuck_for = time.monotonic() - pending.submitted_at
+            if stuck_for > self.stuck_after and len(pending.tx_hashes) <= self.max_bumps:
+                try:
+                    tx_hash = self.speed_up(pending)
+                    print(f"Sped up {pending.label or 'transaction'}: {tx_hash}")
+                except Exception as e:
+                    # most likely the original was mined in the meantime
+                    print(f"Could not speed up {pending.label or pending.tx_hash}: {e}")
+                    pending.submitted_at = time.monotonic()
+
+            if self._closed.wait(self.poll_interval):
+                raise Exception(
+                    f"stopped tracking {pending.label or pending.tx_hash}, the "
+                    "pipeline was closed"
+                )
+
+    def wait(self, pending: PendingTransaction):
+        return pending.receipt.result()
+
+    def wait_all(self) -> list:
+        """
+        Wait for every submitted transaction, returning receipts in submission order.
+        """
+        with self._lock:
+            pending = list(self.pending)
+        return [p.receipt.result() for p in pending]
@@ -1,15 +1,17 @@
-import json
+import os
 from datetime import datetime, timedelta
 
-import boto3
-import requests
 from dydx3.constants import *
-from eulith_web3.kms import KmsSigner
-from eulith_web3.signer import Signer
 from web3 import Web3
 
+from abi_registry import get_contract
 from credentials import *
-from exceptions import BadJurisdictionException
+from signer_cache import get_kms_signer
+
+# points every network at another dydx API, e.g. the mock server in bench/stand_in.py
+DYDX_HOST = os.environ.get("DYDX_TOOLS_DYDX_HOST")
+# mainnet requests are signed with real credentials, so overriding its host needs this too
+ALLOW_MAINNET_DYDX_HOST = os.environ.get("DYDX_TOOLS_ALLOW_MAINNET_DYDX_HOST") == "1"
 
 
 def get_exchange_contract_address(network_id: int):
@@ -17,7 +19,14 @@ def get_exchange_contract_address(network_id: int):
 
 
 def get_dydx_host(network_id: int):
-    if network_id == NETWORK_ID_MAINNET:
+    if DYDX_HOST:
+        if network_id == NETWORK_ID_MAINNET and not ALLOW_MAINNET_DYDX_HOST:
+            raise Exception(
+                "DYDX_TOOLS_DYDX_HOST would send signed mainnet requests to "
+                f"{DYDX_HOST}, also set DYDX_TOOLS_ALLOW_MAINNET_DYDX_HOST=1 to allow that"
+            )
+        return DYDX_HOST.rstrip("/")
+    elif network_id == NETWORK_ID_MAINNET:
         return "https://api.dydx.exchange"
     elif network_id == NETWORK_ID_SEPOLIA:
         return "https://api.stage.dydx.exchange"
@@ -27,22 +36,7 @@ def get_dydx_host(network_id: int):
 
 def get_exchange_contract(network_id: int, web3: Web3):
     contract_address = get_exchange_contract_address(network_id)
-
-    return web3.eth.contract(
-        address=contract_address,
-        abi=json.load(open("abi/starkware-perpetuals.json", "r")),
-    )
-
-
-def get_kms_signer() -> Signer:
-    aws_credentials_profile_name = AWS_CREDENTIALS_PROFILE_NAME
-    formatted_key_name = f"alias/{ETH_SIGNER_KEY_NAME}"
-
-    session = boto3.Session(profile_name=aws_credentials_profile_name)
-    client = session.client("kms")
-
-    kms_signer = KmsSigner(client, formatted_key_name)
-    return kms_signer
+    return get_contract(web3, "starkware-perpetuals", contract_address)
 
 
 def now_timestamp_plus_minutes(minutes: int) -> str:
@@ -53,14 +47,3 @@ def now_timestamp_plus_minutes(minutes: int) -> str:
     )
 
     return timestamp
-
-
-def check_ip_location():
-    response = requests.get("https://ipinfo.io/json").json()
-    timezone = response.get("timezone")
-    if "Europe" not in timezone:
-        raise BadJurisdictionException(
-            "If you make a request from a blocked jurisdiction, "
-            "dydx will permanently ban you and shut down your account. "
-            "Shutting down now to prevent this."
-        )
@@ -0,0 +1,14 @@
+from credentials import *
+from signer_cache import get_kms_signer, invalidate_signer_cache
+
+
+def show_wallet(_args):
+    signer = get_kms_signer()
+    print(f"wallet address: {signer.address}")
+
+
+def clear_signer_cache(_args):
+    invalidate_signer_cache(
+        AWS_CREDENTIALS_PROFILE_NAME, f"alias/{ETH_SIGNER_KEY_NAME}"
+    )
+    print("Cleared cached wallet address for the configured KMS key")
@@ -0,0 +1,80 @@
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from eulith_web3.eulith_web3 import EulithWeb3
+from eulith_web3.signer import Signer
+from eulith_web3.signing import construct_signing_middleware
+
+from credentials import *
+from instrumentation import span
+
+ETH_RPC_URL = os.environ.get(
+    "DYDX_TOOLS_ETH_RPC_URL", "https://eth-main.eulithrpc.com/v0"
+)
+
+# signer address -> entered EulithWeb3, only populated in long-running processes
+_warm: Optional[Dict[str, EulithWeb3]] = None
+_warm_lock = threading.Lock()
+
+
+def rpc_timing_middleware(make_request, w3):
+    def middleware(method, params):
+        with span("eth.rpc", method) as s:
+            response = make_request(method, params)
+            if "error" in response:
+                s.set_error()
+            return response
+
+    return middleware
+
+
+def _new_eulith_web3(signer: Signer) -> EulithWeb3:
+    ew3 = EulithWeb3(
+        ETH_RPC_URL,
+        eulith_token=EULITH_TOKEN,
+        signing_middle_ware=construct_signing_middleware(signer),
+    )
+    # innermost, so each span is one request on the wire
+    ew3.middleware_onion.inject(rpc_timing_middleware, "rpc_timing", layer=0)
+    return ew3
+
+
+@contextmanager
+def open_web3(signer: Signer):
+    """
+    Open a EulithWeb3 signing with `signer`. Normally the connection is closed on exit; after
+    keep_web3_warm() it is kept open and reused by later calls for the same signer.
+    """
+    if _warm is None:
+        with _new_eulith_web3(signer) as ew3:
+            yield ew3
+        return
+
+    with _warm_lock:
+        ew3 = _warm.get(signer.address)
+        if ew3 is None:
+            ew3 = _warm[signer.address] = _new_eulith_web3(signer).__enter__()
+    yield ew3
+
+
+def keep_web3_warm() -> bool:
+    """
+    Keep connections open from now on. True if this call turned that on, i.e. the caller
+    owns the connections and should close_warm_web3() when done.
+    """
+    global _warm
+    with _warm_lock:
+        if _warm is not None:
+            return False
+        _warm = {}
+        return True
+
+
+def close_warm_web3():
+    global _warm
+    with _warm_lock:
+        warm, _warm = _warm, None
+    for ew3 in (warm or {}).values():
+        ew3.__exit__(None, None, None)